@@ -0,0 +1,107 @@
+"""
+Stand-in for the sense_hat module, so that benchmarks can be run without a
+Sense Hat.
+
+The FakeSenseHat class does the same work as the real SenseHat class when
+setting and getting pixels (checking each pixel and packing it into RGB565),
+but writes to a bytearray rather than the framebuffer device.
+"""
+from __future__ import absolute_import
+import struct
+import sys
+import types
+import numpy as np
+
+
+class FakeSenseHat(object):
+
+    def __init__(self, *args, **kwargs):
+
+        self._rotation = 0
+        self._framebuffer = bytearray(128)
+
+        pix_map0 = np.arange(64).reshape(8,8)
+        self._pix_map = {
+              0: pix_map0,
+             90: np.rot90(pix_map0),
+            180: np.rot90(pix_map0, 2),
+            270: np.rot90(pix_map0, 3),
+        }
+
+
+    @property
+    def rotation(self):
+
+        return self._rotation
+
+
+    def set_rotation(self, r=0, redraw=True):
+
+        if r not in self._pix_map:
+            raise ValueError('Rotation must be 0, 90, 180 or 270 degrees')
+
+        self._rotation = r
+
+
+    def _pack_bin(self, pix):
+
+        r = (pix[0] >> 3) & 0x1F
+        g = (pix[1] >> 2) & 0x3F
+        b = (pix[2] >> 3) & 0x1F
+        return struct.pack('H', (r << 11) + (g << 5) + b)
+
+
+    def _unpack_bin(self, packed):
+
+        bits16 = struct.unpack('H', packed)[0]
+        r = (bits16 & 0xF800) >> 11
+        g = (bits16 & 0x7E0) >> 5
+        b = (bits16 & 0x1F)
+        return [int(r << 3), int(g << 2), int(b << 3)]
+
+
+    def set_pixels(self, pixel_list):
+
+        if len(pixel_list) != 64:
+            raise ValueError('Pixel lists must have 64 elements')
+
+        for index, pix in enumerate(pixel_list):
+            if len(pix) != 3:
+                raise ValueError('Pixel at index %d is invalid' % index)
+
+            for element in pix:
+                if element > 255 or element < 0:
+                    raise ValueError('Pixel at index %d is invalid' % index)
+
+        pix_map = self._pix_map[self._rotation]
+        for index, pix in enumerate(pixel_list):
+            offset = pix_map[index // 8][index % 8] * 2
+            self._framebuffer[offset:offset+2] = self._pack_bin(pix)
+
+
+    def get_pixels(self):
+
+        pixel_list = []
+        pix_map = self._pix_map[self._rotation]
+        for row in range(8):
+            for col in range(8):
+                offset = pix_map[row][col] * 2
+                pixel_list.append(
+                    self._unpack_bin(bytes(self._framebuffer[offset:offset+2])))
+
+        return pixel_list
+
+
+    def clear(self, *args):
+
+        self.set_pixels([[0, 0, 0]] * 64)
+
+
+def install():
+    """
+    Install this module in place of the sense_hat module.
+    """
+
+    module = types.ModuleType('sense_hat')
+    module.SenseHat = FakeSenseHat
+    sys.modules['sense_hat'] = module
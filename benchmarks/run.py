@@ -0,0 +1,362 @@
+"""
+Benchmarks for the hot paths of sense_graphics.
+
+Runs each benchmark against a fake Sense Hat (see fake_sense_hat.py), and
+reports the number of frames processed per second and the peak memory
+allocated while processing a frame. Results can be saved to a JSON file, and
+compared against a previously saved file to catch performance regressions:
+
+    python benchmarks/run.py --output baseline.json
+    python benchmarks/run.py --baseline baseline.json
+
+The exit status is 1 if any benchmark is slower, or allocates more memory,
+than the baseline by more than the tolerance.
+"""
+from __future__ import absolute_import, division, print_function
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_sense_hat
+fake_sense_hat.install()
+
+import numpy as np
+from sense_graphics import LayerSet, SenseGraph, SenseImage
+from sense_graphics.frame import Frame
+from sense_graphics.image_layer import ImageLayer, ScrollingLayer
+from sense_graphics.image_layer import FlashingLayer
+
+
+# Registered benchmarks, as (name, setup) pairs. Each setup function returns
+# a function that processes the frame number passed to it, and returns the
+# number of frames processed (or None for a single frame).
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Decorator that registers a benchmark setup function under name.
+    """
+
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+
+    return register
+
+
+def random_layer_set(num_layers, seed=0, **kwargs):
+    """
+    Return a LayerSet of num_layers random, partly transparent layers.
+    """
+
+    rng = np.random.RandomState(seed)
+    layer_set = LayerSet(**kwargs)
+
+    for idx in range(num_layers):
+        rgb   = rng.randint(0, 256, (64, 3))
+        alpha = rng.randint(0, 256, 64)
+        alpha[rng.rand(64) < 0.3] = 0
+        layer_set.add_layer(rgb, alpha, "Layer %d" % idx)
+
+    return layer_set
+
+
+def random_layer(seed=0):
+
+    rng = np.random.RandomState(seed)
+
+    return ImageLayer(rng.randint(0, 256, (64, 3)), rng.randint(0, 256, 64))
+
+
+def _composite(num_layers):
+
+    def setup():
+        # Every layer is static, so flattening would leave a single layer
+        layer_set = random_layer_set(num_layers, flatten_static=False)
+
+        def run(frame_num):
+            layer_set._create_frame(frame_num)
+
+        return run
+
+    return setup
+
+
+for _num_layers in (1, 8, 32, 128):
+    benchmark("composite_%d_layers" % _num_layers)(_composite(_num_layers))
+
+
+@benchmark("dashboard_40_layers_1_animated")
+def _dashboard():
+
+    # The static layers are all behind the animated one, so are only
+    # combined ahead of time when asked to
+    layer_set = random_layer_set(40, flatten_static=True)
+    layer_set.add_effect_scrolling(0, 'E', 8)
+
+    def run(frame_num):
+        layer_set._create_frame(frame_num)
+
+    return run
+
+
+def _chain(effect, depth):
+
+    def setup():
+        layer = random_layer()
+        for idx in range(depth):
+            if effect == 'scrolling':
+                layer = ScrollingLayer(layer, 'NESW'[idx % 4], idx)
+            else:
+                layer = FlashingLayer(layer, [255, 128, 0, 64][:2 + idx % 3])
+
+        def run(frame_num):
+            layer.get_pixels(frame_num % len(layer))
+
+        return run
+
+    return setup
+
+
+for _effect in ('scrolling', 'flashing'):
+    for _depth in (1, 2, 4, 8):
+        benchmark("%s_chain_depth_%d" % (_effect, _depth))(
+            _chain(_effect, _depth))
+
+
+@benchmark("render_frames_8_layers")
+def _render_frames():
+
+    layer_set = random_layer_set(8)
+    layer_set.add_effect_scrolling(0, 'E', 8)
+    layer_set.add_effect_flashing(3, [255, 128, 0])
+    layer_set.add_effect_scrolling(5, 'S', 5)
+
+    def run(frame_num):
+        layer_set.render_frames(frame_num * 256, (frame_num + 1) * 256)
+        return 256
+
+    return run
+
+
+@benchmark("render_into_8_layers")
+def _render_into():
+
+    # With the cache disabled every frame is combined in the LayerSet's
+    # buffers, so no arrays are created per frame. The memory reported is
+    # the scratch space numpy uses while broadcasting, which is freed again
+    layer_set = random_layer_set(8, cache_bytes=0)
+    layer_set.add_effect_scrolling(0, 'E', 8)
+    layer_set.add_effect_flashing(3, [255, 128, 0])
+    layer_set.add_effect_scrolling(5, 'S', 5)
+
+    out = np.empty((8, 8, 3), dtype=np.uint8)
+
+    def run(frame_num):
+        layer_set.render_into(frame_num, out)
+
+    return run
+
+
+@benchmark("transition_crossfade_8_layers")
+def _transition():
+
+    outgoing = random_layer_set(8)
+    outgoing.add_effect_scrolling(0, 'E', 8)
+    incoming = random_layer_set(8)
+    incoming.add_effect_flashing(2, [255, 128, 0])
+
+    transition = outgoing.transition_to(incoming, 64, 'crossfade')
+
+    def run(frame_num):
+        # Create every frame of the transition again
+        transition.clear_cache()
+        transition.render(0)
+        return 64
+
+    return run
+
+
+@benchmark("frame_to_list")
+def _frame_to_list():
+
+    layer = random_layer()
+    frame = Frame(layer.rgb, layer.alpha)
+
+    def run(frame_num):
+        frame.to_list()
+
+    return run
+
+
+@benchmark("graph_add_bar")
+def _graph_add_bar():
+
+    graph  = SenseGraph()
+    values = np.random.RandomState(0).rand(1024).tolist()
+
+    def run(frame_num):
+        graph.add_bar(values[frame_num % 1024])
+
+    return run
+
+
+@benchmark("graph_add_values_3_series")
+def _graph_add_values():
+
+    graph = SenseGraph()
+    graph.add_series('cpu', [255, 0, 0])
+    graph.add_series('memory', [0, 255, 0], low=0, high=1)
+    graph.add_series('temperature', [0, 0, 255], style='line', horizon=64)
+
+    values = np.random.RandomState(0).rand(1024, 3).tolist()
+
+    def run(frame_num):
+        graph.add_values(values[frame_num % 1024])
+
+    return run
+
+
+@benchmark("set_pixels_dynamic_8_layers")
+def _set_pixels_dynamic():
+
+    image = SenseImage()
+    layer_set = random_layer_set(8, cache_bytes=0)
+    layer_set.add_effect_scrolling(0, 'E', 8)
+    layer_set.add_effect_flashing(1, [255, 128, 0])
+
+    def run(frame_num):
+        # Use a frame rate so high that frames are shown back to back
+        stats = image.set_pixels_dynamic(layer_set, fps=1e6, total_time=1e-4,
+                                         drop_policy='catch_up')
+        return stats.frames_shown
+
+    return run
+
+
+def measure(run, min_time=0.5, alloc_frames=20):
+    """
+    Return the frames per second and peak bytes allocated per frame of run.
+    """
+
+    # Warm up any caches before measuring
+    run(0)
+
+    frame_num = frames = 0
+    start = time.perf_counter()
+
+    while True:
+        processed = run(frame_num)
+        frames += 1 if processed is None else processed
+        frame_num += 1
+
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+
+    # Memory allocated while processing each frame, above what was already
+    # allocated beforehand
+    tracemalloc.start()
+    peak_bytes = 0
+    peak_frames = 0
+
+    try:
+        for idx in range(alloc_frames):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+            processed = run(frame_num + idx)
+
+            peak_bytes += tracemalloc.get_traced_memory()[1] - current
+            peak_frames += 1 if processed is None else processed
+
+    finally:
+        tracemalloc.stop()
+
+    return {'fps': frames / elapsed,
+            'alloc_bytes': peak_bytes / peak_frames}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return a list describing each benchmark that is worse than the baseline.
+    """
+
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        if result['fps'] < base['fps'] * (1 - tolerance):
+            regressions.append("%s: %.1f fps, baseline %.1f fps"
+                               % (name, result['fps'], base['fps']))
+
+        # Allow for small variations in the memory used by Python itself
+        allowed = base['alloc_bytes'] * (1 + tolerance) + 256
+        if result['alloc_bytes'] > allowed:
+            regressions.append("%s: %.0f bytes per frame, baseline %.0f"
+                               % (name, result['alloc_bytes'],
+                                  base['alloc_bytes']))
+
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', help="save the results to this file")
+    parser.add_argument('--baseline',
+                        help="compare the results with this file")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="fraction by which results may be worse than "
+                             "the baseline (default 0.15)")
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help="minimum time to run each benchmark for, in "
+                             "seconds (default 0.5)")
+    parser.add_argument('--filter', default='',
+                        help="only run benchmarks whose names contain this")
+    args = parser.parse_args(argv)
+
+    results = {}
+
+    for name, setup in BENCHMARKS:
+        if args.filter not in name:
+            continue
+
+        results[name] = result = measure(setup(), args.min_time)
+        print("%-32s %12.1f fps %12.0f bytes/frame"
+              % (name, result['fps'], result['alloc_bytes']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python'  : platform.python_version(),
+                       'numpy'   : np.__version__,
+                       'machine' : platform.machine(),
+                       'results' : results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+        regressions = compare(results, baseline, args.tolerance)
+
+        for regression in regressions:
+            print("REGRESSION " + regression)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
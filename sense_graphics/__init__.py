@@ -1,4 +1,41 @@
 from __future__ import absolute_import
-from .sense_graph import SenseGraph
-from .sense_image import SenseImage
-from .layer_set import LayerSet
+import importlib
+
+# Classes are only imported when first used, so that importing the package
+# does not import the sense_hat module (and with it the Sense Hat hardware)
+# unless the SenseGraph or SenseImage classes are used.
+_modules = {
+    'SenseGraph'       : '.sense_graph',
+    'SenseImage'       : '.sense_image',
+    'LayerSet'         : '.layer_set',
+    'CanvasLayer'      : '.canvas_layer',
+    'TextLayer'        : '.text_layer',
+    'AnimationFile'    : '.animation_file',
+    'AnimationPlayer'  : '.playback',
+    'DisplayBackend'   : '.display',
+    'VirtualDisplay'   : '.display',
+    'FramebufferOutput': '.framebuffer',
+    'RenderStats'      : '.profiling',
+    'RenderPool'       : '.render_pool',
+    'ColourLUT'        : '.colour_lut',
+    'Transition'       : '.transition',
+}
+
+__all__ = sorted(_modules)
+
+
+def __getattr__(name):
+
+    if name not in _modules:
+        raise AttributeError("module %r has no attribute %r"
+                             % (__name__, name))
+
+    value = getattr(importlib.import_module(_modules[name], __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+
+    return sorted(set(globals()) | set(_modules))
@@ -0,0 +1,126 @@
+from __future__ import absolute_import
+import struct
+import numpy as np
+
+
+# Files start with a fixed size header, followed by the frames as a single
+# Fx8x8x3 uint8 array in C order. The header holds the magic string, the
+# version of the format, the number of frames and the frame rate.
+MAGIC          = b'\x93SHGANIM'
+VERSION        = 1
+HEADER_FORMAT  = '<8sB3xId'
+HEADER_BYTES   = 64
+
+
+def save_animation(path, frames, fps):
+    """
+    Save a sequence of frames to an animation file.
+
+    Inputs:
+    -------
+    path   - The path of the file to create.
+    frames - Iterable of 8x8x3 arrays (or 64x3 arrays or lists) of rgb values
+             between 0 and 255, e.g. an Fx8x8x3 array. Frames are written to
+             the file one at a time, so they may be produced by a generator.
+    fps    - The number of frames per second to play the animation at.
+    """
+
+    if fps <= 0:
+        raise ValueError("fps should be greater than 0")
+
+    with open(path, 'wb') as f:
+
+        # Leave space for the header until the number of frames is known
+        f.write(b'\0' * HEADER_BYTES)
+
+        num_frames = 0
+        for frame in frames:
+            frame = np.asarray(frame, dtype=np.uint8).reshape(8,8,3)
+            f.write(frame.tobytes())
+            num_frames += 1
+
+        if num_frames == 0:
+            raise ValueError("An animation must have at least one frame")
+
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, num_frames, fps))
+
+
+class AnimationFile(object):
+    """
+    Animation saved to a file, played back using a memory map.
+
+    The frames are memory mapped rather than read into memory, so opening a
+    file is almost instant and the memory used does not depend on the length
+    of the animation. An AnimationFile can be used in place of a LayerSet
+    object when displaying animations, e.g. with the set_pixels_dynamic
+    method of the SenseImage class. Frames loop around after len(self)
+    frames.
+
+    Methods:
+    --------
+    render - Return the rgb values of a frame as an array.
+    """
+
+    def __init__(self, path):
+        """
+        Open the animation file at path.
+        """
+
+        self.path = path
+
+        with open(path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+
+        if (len(header) < struct.calcsize(HEADER_FORMAT) or
+                not header.startswith(MAGIC)):
+            raise ValueError("'%s' is not an animation file" % path)
+
+        magic, version, num_frames, fps = struct.unpack(HEADER_FORMAT, header)
+
+        if version != VERSION:
+            raise ValueError("Unsupported animation file version %d" % version)
+
+        self.fps    = fps
+        self.frames = np.memmap(path, dtype=np.uint8, mode='r',
+                                offset=HEADER_BYTES,
+                                shape=(num_frames, 8, 8, 3))
+
+
+    def __repr__(self):
+
+        return self.__class__.__name__ + '("' + self.path + '")'
+
+
+    def __len__(self):
+
+        return len(self.frames)
+
+
+    def __getitem__(self, idx):
+        """
+        Return frame idx as a 64 element list of rgb values.
+
+        The list can be displayed using the SenseHat class' set_pixels method.
+        """
+
+        return self.render(idx).reshape(64,3).tolist()
+
+
+    def __getstate__(self):
+
+        # Reopen the file rather than copying the frames when pickled
+        return {'path': self.path}
+
+
+    def __setstate__(self, state):
+
+        self.__init__(state['path'])
+
+
+    def render(self, frame_num):
+        """
+        Return the rgb values of frame frame_num as an 8x8x3 uint8 array.
+        """
+
+        return self.frames[frame_num % len(self.frames)]
@@ -0,0 +1,265 @@
+from __future__ import absolute_import, division
+import numpy as np
+from .image_layer import ImageLayer
+
+
+class CanvasLayer(ImageLayer):
+    """
+    Layer holding an image of any size, shown through a movable 8x8 viewport.
+
+    A CanvasLayer keeps an image larger than the LED matrix, for example an
+    8x2000 pixel banner, as a single HxWx4 uint8 array (self.rgba). Each frame
+    of the layer shows the 8x8 area of the canvas under the viewport, which is
+    moved along a path of positions, one per frame. The values for a frame are
+    a view of the canvas rather than a copy, so the memory used does not
+    depend on the length of the animation. Very large canvases can be kept in
+    a file and memory mapped rather than read into memory (see the create_file
+    and open_file methods).
+
+    Methods:
+    --------
+    from_rgba   - Create a CanvasLayer that uses an existing HxWx4 array.
+    create_file - Create a blank canvas stored in a file.
+    open_file   - Open a canvas stored in a file.
+    set_path    - Set the position of the viewport for each frame.
+    set_scroll  - Move the viewport from one end of the canvas to the other.
+    set_pan     - Move the viewport in a straight line between two positions.
+    """
+
+    __slots__ = ('path', 'filename')
+
+    def __init__(self, rgb, alpha, name="Canvas"):
+        """
+        Initialise the canvas with a copy of the given rgb and alpha values.
+
+        Inputs:
+        -------
+        rgb   - HxWx3 array (or nested lists) of red, green and blue values
+                between 0 and 255. The canvas must be at least 8x8 pixels.
+        alpha - HxW array (or nested lists) of alpha values between 0 and 255.
+        name  - The name of this layer.
+        """
+
+        rgb   = np.asarray(rgb)
+        alpha = np.asarray(alpha)
+
+        if rgb.ndim != 3 or rgb.shape[2] != 3:
+            raise ValueError("dimensions of rgb should be HxWx3")
+
+        if alpha.shape != rgb.shape[:2]:
+            raise ValueError("dimensions of alpha should be HxW")
+
+        rgba = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+        rgba[:,:,:3] = rgb
+        rgba[:,:,3]  = alpha
+
+        self._set_canvas(rgba, name)
+
+
+    @classmethod
+    def from_rgba(cls, rgba, name="Canvas"):
+        """
+        Create a CanvasLayer from an HxWx4 uint8 array of rgb and alpha values.
+
+        The array is used as it is rather than copied, so changes made to it
+        afterwards (e.g. drawing on the canvas) are shown in later frames.
+        """
+
+        layer = cls.__new__(cls)
+        layer._set_canvas(rgba, name)
+
+        return layer
+
+
+    @classmethod
+    def create_file(cls, filename, height, width, name="Canvas"):
+        """
+        Create a blank, transparent canvas stored in the file filename.
+
+        The file is created (or overwritten) in numpy's .npy format, and the
+        canvas is memory mapped, so that only the parts of it which are
+        drawn on or shown are read into memory. Draw on the canvas through
+        the layer's rgba, rgb and alpha attributes.
+        """
+
+        rgba = np.lib.format.open_memmap(filename, mode='w+', dtype=np.uint8,
+                                         shape=(height, width, 4))
+
+        layer = cls.from_rgba(rgba, name)
+        layer.filename = filename
+
+        return layer
+
+
+    @classmethod
+    def open_file(cls, filename, name="Canvas", mode='r'):
+        """
+        Open a canvas stored in a .npy file, without reading it into memory.
+
+        Inputs:
+        -------
+        filename - The file, e.g. one created using create_file, or saved with
+                   numpy.save from an HxWx4 uint8 array.
+        name     - The name of this layer.
+        mode     - 'r' to open the canvas read-only, or 'r+' to allow drawing
+                   on it, in which case changes are written to the file.
+        """
+
+        layer = cls.from_rgba(np.load(filename, mmap_mode=mode), name)
+        layer.filename = filename
+
+        return layer
+
+
+    def __getstate__(self):
+
+        state = {}
+        for cls in type(self).__mro__:
+            for attr in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, attr):
+                    state[attr] = getattr(self, attr)
+
+        # Reopen files rather than copying the canvas when pickled
+        if self.filename is not None:
+            state['rgba'] = None
+
+        return state
+
+
+    def __setstate__(self, state):
+
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
+        if self.filename is not None:
+            self.rgba = np.load(self.filename, mmap_mode='r')
+
+
+    def get_rgba(self, frame_num=0, out=None):
+        """
+        Returns a view of the 8x8 area of the canvas shown in frame frame_num,
+        or copies its values to out if it is given.
+        """
+
+        row, col = self.path[frame_num % self.num_frames]
+
+        if out is None:
+            return self.rgba[row:row+8, col:col+8]
+
+        np.copyto(out, self.rgba[row:row+8, col:col+8])
+
+        return out
+
+
+    def get_rgba_frames(self, frame_nums):
+        """
+        Returns the rgba values for several frames of the layer at once.
+        """
+
+        path = np.asarray(self.path)[np.asarray(frame_nums) % self.num_frames]
+
+        rows = path[:,0,np.newaxis] + np.arange(8)
+        cols = path[:,1,np.newaxis] + np.arange(8)
+
+        return self.rgba[rows[:,:,np.newaxis], cols[:,np.newaxis,:]]
+
+
+    def set_path(self, path):
+        """
+        Set the position of the viewport for each frame of the layer.
+
+        Inputs:
+        -------
+        path - Sequence of (row, column) positions of the top left corner of
+               the viewport, one for each frame. The viewport must lie within
+               the canvas, so rows must be between 0 and height-8, and
+               columns between 0 and width-8. The number of frames of the
+               layer becomes the length of the path.
+        """
+
+        path = np.asarray(path, dtype=np.intp).reshape(-1, 2)
+
+        if len(path) == 0:
+            raise ValueError("The path must have at least one position")
+
+        height, width = self.rgba.shape[:2]
+
+        if (path.min() < 0 or path[:,0].max() > height - 8 or
+                path[:,1].max() > width - 8):
+            raise ValueError("The viewport must lie within the %dx%d canvas"
+                             % (height, width))
+
+        self.path       = [tuple(position) for position in path.tolist()]
+        self.num_frames = len(self.path)
+
+
+    def set_scroll(self, direction='E', step=1):
+        """
+        Move the viewport from one edge of the canvas to the opposite edge.
+
+        Inputs:
+        -------
+        direction - The direction in which the viewport moves across the
+                    canvas: 'N', 'S', 'E' or 'W' for north (up), south (down),
+                    east (right) or west (left). The image appears to move the
+                    opposite way, so 'E' suits a ticker that is read from left
+                    to right. The viewport starts at the opposite edge, in the
+                    middle of the canvas' other axis.
+        step      - The number of pixels the viewport moves each frame.
+        """
+
+        if direction not in ('N', 'S', 'E', 'W'):
+            raise ValueError("direction should be 'N', 'S', 'E' or 'W'")
+
+        height, width = self.rgba.shape[:2]
+
+        rows = np.arange(0, height - 7, step)
+        cols = np.arange(0, width - 7, step)
+
+        if direction in ('N', 'S'):
+            cols = np.full(len(rows), (width - 8) // 2)
+        else:
+            rows = np.full(len(cols), (height - 8) // 2)
+
+        path = np.column_stack((rows, cols))
+
+        if direction in ('N', 'W'):
+            path = path[::-1]
+
+        self.set_path(path)
+
+
+    def set_pan(self, start, end, num_frames):
+        """
+        Move the viewport in a straight line between two positions.
+
+        Inputs:
+        -------
+        start      - The (row, column) position of the top left corner of the
+                     viewport in the first frame.
+        end        - The position of the viewport in the last frame.
+        num_frames - The number of frames taken to move from start to end.
+        """
+
+        steps = np.linspace(0, 1, num_frames)[:,np.newaxis]
+        path  = np.rint(np.add(start, steps * np.subtract(end, start)))
+
+        self.set_path(path)
+
+
+    def _set_canvas(self, rgba, name):
+
+        if not isinstance(rgba, np.ndarray):
+            raise TypeError("Input rgba should be a numpy array")
+
+        if (rgba.ndim != 3 or rgba.shape[2] != 4 or rgba.dtype != np.uint8):
+            raise ValueError("rgba should be an HxWx4 uint8 array")
+
+        if rgba.shape[0] < 8 or rgba.shape[1] < 8:
+            raise ValueError("The canvas must be at least 8x8 pixels")
+
+        self.rgba     = rgba
+        self.name     = name
+        self.filename = None
+
+        self.set_path([(0, 0)])
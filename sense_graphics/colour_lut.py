@@ -0,0 +1,182 @@
+from __future__ import absolute_import, division
+import math
+import numpy as np
+
+
+# Colour temperature, in kelvin, at which white is shown unchanged
+NEUTRAL_TEMPERATURE = 6500
+
+
+class ColourLUT(object):
+    """
+    Colour correction applied to frames using a lookup table.
+
+    The gamma, brightness, colour temperature and fade settings are combined
+    into a table of the output value for each of the 256 input values of each
+    of the red, green and blue channels (768 bytes in all). Correcting a frame
+    is then a single lookup of every value in this table, and changing a
+    setting only rebuilds the table, so frames that have already been
+    rendered and cached stay valid. Each channel of an input value v becomes
+
+        255 * brightness * fade * temperature gain * (v/255) ** gamma
+
+    rounded to the nearest integer, and limited to 255.
+
+    Assign a ColourLUT to the colour attribute of a LayerSet to correct the
+    frames it renders, or pass one to the set_colour method of the SenseImage
+    class to correct everything it displays.
+
+    Methods:
+    --------
+    set   - Change one or more of the settings.
+    apply - Return corrected rgb values.
+    """
+
+    def __init__(self, gamma=1.0, brightness=1.0,
+                 temperature=NEUTRAL_TEMPERATURE, fade=1.0):
+        """
+        Initialise the table with the given settings.
+
+        Inputs:
+        -------
+        gamma       - Exponent applied to the values (scaled to between 0 and
+                      1), e.g. around 2.2 to correct for the LEDs appearing
+                      brighter than the values given. 1 leaves them unchanged.
+        brightness  - Factor to scale the values by, e.g. 0.3 to dim the
+                      display at night.
+        temperature - Colour temperature of white, in kelvin. Lower values
+                      give warmer (redder) colours and higher values cooler
+                      (bluer) colours, with 6500 leaving colours unchanged.
+        fade        - Further factor to scale the values by, between 0 and 1,
+                      e.g. to fade the whole display in or out.
+        """
+
+        self.table = _build_table(gamma, brightness, temperature, fade)
+
+        self.gamma       = gamma
+        self.brightness  = brightness
+        self.temperature = temperature
+        self.fade        = fade
+
+        self._offsets = np.array([0, 256, 512], dtype=np.uint16)
+
+
+    def __repr__(self):
+
+        return ('%s(gamma=%g, brightness=%g, temperature=%g, fade=%g)'
+                % (self.__class__.__name__, self.gamma, self.brightness,
+                   self.temperature, self.fade))
+
+
+    def set(self, gamma=None, brightness=None, temperature=None, fade=None):
+        """
+        Change one or more of the settings, leaving those not given as they
+        are. See __init__ for the meaning of each setting. If a setting is
+        not valid a ValueError is raised and none of the settings change.
+        """
+
+        if gamma is None:
+            gamma = self.gamma
+
+        if brightness is None:
+            brightness = self.brightness
+
+        if temperature is None:
+            temperature = self.temperature
+
+        if fade is None:
+            fade = self.fade
+
+        # Build the table before storing the settings, so that they are only
+        # changed once they have been checked
+        self.table = _build_table(gamma, brightness, temperature, fade)
+
+        self.gamma       = gamma
+        self.brightness  = brightness
+        self.temperature = temperature
+        self.fade        = fade
+
+
+    def apply(self, values, out=None):
+        """
+        Return a corrected copy of an array of rgb values.
+
+        Inputs:
+        -------
+        values - uint8 array of any shape whose last dimension holds the red,
+                 green and blue values, e.g. an 8x8x3 frame or an Fx8x8x3
+                 array of frames.
+        out    - Optional uint8 array of the same shape to write the result
+                 to. This may be values itself to correct it in place.
+        """
+
+        values = np.asarray(values, dtype=np.uint8)
+
+        # Index into the table of each channel of the flattened 3x256 table
+        return np.take(self.table.ravel(), values + self._offsets, out=out)
+
+
+def _build_table(gamma, brightness, temperature, fade):
+    """
+    Return the read-only 3x256 uint8 table for the given settings, raising
+    ValueError if any of them is not valid.
+    """
+
+    if gamma <= 0:
+        raise ValueError("gamma should be greater than 0")
+
+    if brightness < 0 or not 0 <= fade <= 1:
+        raise ValueError("brightness should be at least 0, and fade "
+                         "between 0 and 1")
+
+    scale = brightness * fade * _temperature_gains(temperature)
+
+    levels = (np.arange(256) / 255) ** gamma
+    table  = np.rint(np.minimum(scale[:,np.newaxis] * levels, 1) * 255)
+
+    table = table.astype(np.uint8)
+    table.flags.writeable = False
+
+    return table
+
+
+def _temperature_gains(temperature):
+    """
+    Return the red, green and blue gains for a colour temperature in kelvin.
+
+    The gains are relative to NEUTRAL_TEMPERATURE, at which they are all 1,
+    and are scaled so that none is above 1. The colour of each temperature is
+    approximated with Tanner Helland's fit to the black body colours.
+    """
+
+    if temperature <= 0:
+        raise ValueError("temperature should be greater than 0")
+
+    gains = (np.array(_black_body(temperature)) /
+             _black_body(NEUTRAL_TEMPERATURE))
+
+    return gains / max(1.0, gains.max())
+
+
+def _black_body(temperature):
+    """
+    Return the approximate (red, green, blue) colour of a black body.
+    """
+
+    t = temperature / 100
+
+    if t <= 66:
+        red   = 255.0
+        green = 99.4708025861 * math.log(t) - 161.1195681661
+    else:
+        red   = 329.698727446 * (t - 60) ** -0.1332047592
+        green = 288.1221695283 * (t - 60) ** -0.0755148492
+
+    if t >= 66:
+        blue = 255.0
+    elif t <= 19:
+        blue = 0.0
+    else:
+        blue = 138.5177312231 * math.log(t - 10) - 305.0447927307
+
+    return [min(max(value, 0.0), 255.0) for value in (red, green, blue)]
@@ -0,0 +1,182 @@
+from __future__ import absolute_import
+from collections import deque
+import numpy as np
+
+
+class DisplayBackend(object):
+    """
+    Base class for the displays that animations can be shown on.
+
+    A display backend receives the frames of an animation and shows them, for
+    example on the Sense Hat's LED matrix. All backends should be subclassed
+    off this class, and override the write method. Frames are passed to write
+    as 8x8x3 uint8 arrays of rgb values, unless uses_lists is True, in which
+    case they are passed as 64 element lists of rgb values (as accepted by the
+    SenseHat class' set_pixels method). The same array may be passed for
+    each frame, so backends should copy any frame they need to keep.
+
+    Backends that can update individual pixels more cheaply than a whole
+    frame should set supports_partial to True and override write_changed.
+
+    Methods:
+    --------
+    write         - Show a frame on the display.
+    write_changed - Show a frame that differs from the last in a few pixels.
+    close         - Release any resources held by the display.
+    """
+
+    uses_lists       = False
+    supports_partial = False
+
+
+    def __enter__(self):
+
+        return self
+
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+    def write(self, pixels):
+        """
+        Show a frame on the display.
+        """
+
+        raise NotImplementedError
+
+
+    def write_changed(self, pixels, changed):
+        """
+        Show a frame that differs from the last frame written in only the
+        pixels marked in changed.
+
+        Inputs:
+        -------
+        pixels  - 8x8x3 uint8 array of rgb values of the whole frame.
+        changed - 8x8 boolean array that is True for the pixels which differ
+                  from the last frame written.
+
+        By default the whole frame is written.
+        """
+
+        if self.uses_lists:
+            pixels = pixels.reshape(64,3).tolist()
+
+        self.write(pixels)
+
+
+    def close(self):
+        """
+        Release any resources held by the display.
+        """
+
+        pass
+
+
+class SenseHatDisplay(DisplayBackend):
+    """
+    Display backend that shows frames using a SenseHat object's set_pixels.
+
+    Frames that differ from the last in only a few pixels can be shown using
+    set_pixel for each changed pixel instead (see write_changed).
+    """
+
+    uses_lists       = True
+    supports_partial = True
+
+
+    def __init__(self, sense_hat):
+
+        self.sense_hat = sense_hat
+
+
+    def __repr__(self):
+
+        return self.__class__.__name__ + '(' + repr(self.sense_hat) + ')'
+
+
+    def write(self, pixels):
+
+        self.sense_hat.set_pixels(pixels)
+
+
+    def write_changed(self, pixels, changed):
+
+        for y, x in zip(*np.nonzero(changed)):
+            self.sense_hat.set_pixel(int(x), int(y), pixels[y,x].tolist())
+
+
+class VirtualDisplay(DisplayBackend):
+    """
+    Display backend that records frames in memory rather than showing them.
+
+    A VirtualDisplay can be used to display animations on machines without a
+    Sense Hat, e.g. to test them or to render them on a server. Each frame
+    written is copied as an 8x8x3 array and appended to self.frames.
+
+    Methods:
+    --------
+    write         - Record a frame.
+    write_changed - Record a frame that differs from the last in a few pixels.
+    last_frame - Return the most recently written frame.
+    clear      - Remove all recorded frames.
+    """
+
+    supports_partial = True
+
+
+    def __init__(self, max_frames=None):
+        """
+        Initialise the display.
+
+        Inputs:
+        -------
+        max_frames - The maximum number of frames to keep. Once reached, the
+                     oldest frames are discarded. None to keep every frame.
+        """
+
+        self.frames = deque(maxlen=max_frames)
+
+
+    def __repr__(self):
+
+        return '%s(%d frames)' % (self.__class__.__name__, len(self.frames))
+
+
+    def write(self, pixels):
+
+        self.frames.append(
+            np.array(pixels, dtype=np.uint8).reshape(8,8,3) )
+
+
+    def write_changed(self, pixels, changed):
+
+        if not self.frames:
+            return self.write(pixels)
+
+        # Update a copy of the last frame, as a display would be updated
+        frame = self.frames[-1].copy()
+        frame[changed] = pixels[changed]
+
+        self.frames.append(frame)
+
+
+    def last_frame(self):
+        """
+        Return the most recently written frame, or None if there are none.
+        """
+
+        if self.frames:
+            return self.frames[-1]
+
+        return None
+
+
+    def clear(self):
+        """
+        Remove all recorded frames.
+        """
+
+        self.frames.clear()
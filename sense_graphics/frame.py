@@ -1,5 +1,339 @@
 import numpy as np
 
+
+def composite(layers):
+    """
+    Combine a stack of RGBA layers into a single RGBA image.
+    
+    The layers are given as an Nx8x8x4 array of integers between 0 and 255,
+    with the front-most layer first and the alpha values stored in the last
+    channel. The layers are combined from front to back, each one showing
+    through the transparent areas of the layers in front of it. The result is
+    identical to adding the equivalent Frame objects together in the same
+    order, but every layer is merged in place into a single set of 8x8
+    buffers rather than creating a new Frame for each pair of layers.
+    
+    Returns an 8x8x4 uint8 array with the combined rgb and alpha values.
+    
+    Several frames can be combined at once by giving an NxFx8x8x4 array, in
+    which case an Fx8x8x4 array is returned, i.e. any dimensions between the
+    first and the last are kept.
+    """
+    
+    layers = np.asarray(layers)
+    shape  = layers.shape[1:-1] if layers.ndim > 1 else (8, 8)
+    
+    return Compositor(shape).composite(layers)
+
+
+def premultiply(rgba):
+    """
+    Return a copy of an RGBA array with the rgb values multiplied by alpha.
+    
+    The input can have any number of leading dimensions, as long as the last
+    dimension holds the red, green, blue and alpha values. Each rgb value is
+    scaled by alpha/255 using integer arithmetic, rounding to the nearest
+    integer, and the result is returned as a uint8 array.
+    """
+    
+    rgba = np.asarray(rgba, dtype=np.uint8)
+    
+    values = rgba.astype(np.uint16)
+    values[...,:3] *= rgba[...,3:]
+    _div255(values[...,:3])
+    
+    return values.astype(np.uint8)
+    
+
+def composite_premultiplied(layers):
+    """
+    Combine a stack of premultiplied RGBA layers into a single RGBA image.
+    
+    The layers are given as an Nx8x8x4 uint8 array, front-most layer first,
+    where the rgb values have already been multiplied by alpha (see the
+    premultiply function). Each layer is placed behind the layers in front of
+    it using only integer arithmetic, so no floating point temporaries or
+    division masks are needed. The rgb values of the result are the values to
+    display. The combined values are kept with 8 bits after the point and
+    rounded to the nearest integer once, at the end, so the result is within
+    2 units of the exact result however many layers there are. The composite
+    function rounds down after every layer, so gives darker values, by up to
+    about 4 units with 2 layers, 11 with 8 and 16 with 20.
+    
+    Returns an 8x8x4 uint8 array with the combined premultiplied values. As
+    with the composite function, an NxFx8x8x4 array of layers can be given to
+    combine several frames at once.
+    """
+    
+    layers = np.asarray(layers)
+    shape  = layers.shape[1:-1] if layers.ndim > 1 else (8, 8)
+    
+    return Compositor(shape).composite_premultiplied(layers)
+
+
+def _div255(values, shifted=None):
+    """
+    Divide a uint16 array of products of two 8-bit values by 255 in place.
+    
+    The result is rounded to the nearest integer, i.e. (x + 127) // 255, and is
+    calculated using shifts rather than division. shifted is an optional
+    uint16 array of the same shape to use for the intermediate values.
+    """
+    
+    values += 128
+    
+    if shifted is None:
+        values += values >> 8
+    else:
+        np.right_shift(values, 8, out=shifted)
+        values += shifted
+    
+    values >>= 8
+
+
+class Compositor(object):
+    """
+    Combines stacks of layers using buffers that are kept between calls.
+    
+    The composite and composite_premultiplied functions create their
+    temporary arrays each time they are called. A Compositor creates them
+    the first time they are needed, for images of one shape, and reuses them
+    for every stack of layers it combines, so that a frame can be combined
+    into an existing array without creating any new arrays, although numpy
+    may still use some scratch memory while broadcasting. As the buffers
+    are shared, a Compositor should only be used by one thread at a time.
+    
+    Methods:
+    --------
+    composite               - Combine a stack of RGBA layers.
+    composite_premultiplied - Combine a stack of premultiplied RGBA layers.
+    premultiply             - Multiply the rgb values of a layer by alpha.
+    to_array                - Return the rgb values multiplied by alpha.
+    """
+    
+    __slots__ = ('shape', '_floats', '_ints', '_wide')
+    
+    def __init__(self, shape=(8, 8)):
+        """
+        Initialise the Compositor for images of the given shape.
+        
+        Inputs:
+        -------
+        shape - The dimensions of each layer, not counting the rgba channels,
+                e.g. (8, 8) for single frames, or (F, 8, 8) for F frames.
+        """
+        
+        self.shape = tuple(shape)
+        
+        self._floats = None
+        self._ints   = None
+        self._wide   = None
+    
+    
+    def composite(self, layers, out=None):
+        """
+        Combine a stack of RGBA layers, front-most first, into out.
+        
+        The result is the same as that of the composite function. layers is
+        an Nx...x4 array, where ... is self.shape, and out an optional uint8
+        array of self.shape plus the 4 channels to write the result to.
+        Returns out, or a new array if out is not given.
+        """
+        
+        layers = np.asarray(layers)
+        
+        if out is None:
+            out = np.empty(self.shape + (4,), dtype=np.uint8)
+        
+        if len(layers) == 0:
+            out.fill(0)
+            return out
+        
+        (rgb_total, alpha_total, alpha1, alpha2, ratio, rgb, alpha_nz,
+         layer_rgb, layer_alpha) = self._get_floats()
+        
+        # Work in floating point on whole 8x8 planes, truncating to integers
+        # at each step in the same way as the uint8 arithmetic of adding two
+        # Frames
+        np.copyto(rgb_total, layers[0,...,:3])
+        np.copyto(alpha_total, layers[0,...,3:])
+        
+        for idx in range(1, len(layers)):
+            
+            # Convert the layer to floating point once, so that the
+            # operations below do not each convert it into a temporary array
+            np.copyto(layer_rgb, layers[idx,...,:3])
+            np.copyto(layer_alpha, layers[idx,...,3:])
+            
+            # Alpha of this layer that shows through the layers in front of it
+            np.copyto(alpha1, alpha_total)
+            np.subtract(255, alpha1, out=alpha2)
+            np.divide(alpha2, 255, out=alpha2)
+            np.multiply(layer_alpha, alpha2, out=alpha2)
+            np.floor(alpha2, out=alpha2)
+            np.add(alpha1, alpha2, out=alpha_total)
+            
+            # Weight each rgb value by its share of the combined alpha. Pixels
+            # with no alpha at all are left at zero
+            np.not_equal(alpha_total, 0, out=alpha_nz)
+            
+            ratio.fill(0)
+            np.divide(alpha1, alpha_total, out=ratio, where=alpha_nz)
+            np.multiply(rgb_total, ratio, out=rgb_total)
+            np.floor(rgb_total, out=rgb_total)
+            
+            ratio.fill(0)
+            np.divide(alpha2, alpha_total, out=ratio, where=alpha_nz)
+            np.multiply(layer_rgb, ratio, out=rgb)
+            np.add(rgb_total, rgb, out=rgb_total)
+            np.floor(rgb_total, out=rgb_total)
+        
+        np.copyto(out[...,:3], rgb_total, casting='unsafe')
+        np.copyto(out[...,3:], alpha_total, casting='unsafe')
+        
+        return out
+    
+    
+    def composite_premultiplied(self, layers, out=None):
+        """
+        Combine a stack of premultiplied RGBA layers, front-most first, into
+        out.
+        
+        The result is the same as that of the composite_premultiplied
+        function. The inputs are the same as for the composite method.
+        """
+        
+        layers = np.asarray(layers)
+        rgba, scale, value = self._get_wide()
+        
+        if out is None:
+            out = np.empty(self.shape + (4,), dtype=np.uint8)
+        
+        if len(layers) == 0:
+            out.fill(0)
+            return out
+        
+        # The combined values are kept as fixed point numbers with 8 bits
+        # after the point, so that they are only rounded once, at the end
+        np.copyto(rgba, layers[0])
+        rgba <<= 8
+        
+        for idx in range(1, len(layers)):
+            
+            # Each layer only shows through what is left transparent by the
+            # layers in front of it
+            np.subtract(255 << 8, rgba[...,3:], out=scale)
+            np.copyto(value, layers[idx])
+            value *= scale
+            
+            # Divide by 255, as a multiplication by 257/65536 rounded to the
+            # nearest integer, which is out by less than 1/256 at most
+            value *= 257
+            value += 32768
+            value >>= 16
+            rgba += value
+        
+        rgba += 128
+        rgba >>= 8
+        np.copyto(out, rgba, casting='unsafe')
+        
+        return out
+    
+    
+    def premultiply(self, rgba, out=None):
+        """
+        Multiply the rgb values of an RGBA layer by its alpha values.
+        
+        The result is the same as that of the premultiply function. rgba is a
+        uint8 array of self.shape plus the 4 channels, and out an optional
+        array of the same shape to write the result to, which may be rgba
+        itself.
+        """
+        
+        values, shifted = self._get_ints()
+        values  = values[...,:3]
+        shifted = shifted[...,:3]
+        
+        if out is None:
+            out = np.empty(self.shape + (4,), dtype=np.uint8)
+        
+        np.copyto(values, rgba[...,:3])
+        values *= rgba[...,3:]
+        _div255(values, shifted)
+        
+        np.copyto(out[...,3], rgba[...,3])
+        np.copyto(out[...,:3], values, casting='unsafe')
+        
+        return out
+    
+    
+    def to_array(self, rgba, out=None):
+        """
+        Return the rgb values of an RGBA image multiplied by its alpha values.
+        
+        The result is the same as that of the Frame class' to_array method.
+        out is an optional uint8 array of self.shape plus the 3 rgb channels
+        to write the result to.
+        """
+        
+        if out is None:
+            out = np.empty(self.shape + (3,), dtype=np.uint8)
+        
+        floats = self._get_floats()
+        scale, rgb = floats[4], floats[5]
+        
+        np.copyto(scale, rgba[...,3:])
+        np.copyto(rgb, rgba[...,:3])
+        np.divide(scale, 255, out=scale)
+        np.multiply(rgb, scale, out=rgb)
+        np.copyto(out, rgb, casting='unsafe')
+        
+        return out
+    
+    
+    def _get_floats(self):
+        """
+        Return the floating point buffers used by the composite method.
+        """
+        
+        if self._floats is None:
+            shape = self.shape
+            self._floats = (np.empty(shape + (3,)), np.empty(shape + (1,)),
+                            np.empty(shape + (1,)), np.empty(shape + (1,)),
+                            np.empty(shape + (1,)), np.empty(shape + (3,)),
+                            np.empty(shape + (1,), dtype=bool),
+                            np.empty(shape + (3,)), np.empty(shape + (1,)))
+        
+        return self._floats
+    
+    
+    def _get_ints(self):
+        """
+        Return the uint16 buffers used by the premultiply method.
+        """
+        
+        if self._ints is None:
+            shape = self.shape
+            self._ints = (np.empty(shape + (4,), dtype=np.uint16),
+                          np.empty(shape + (4,), dtype=np.uint16))
+        
+        return self._ints
+    
+    
+    def _get_wide(self):
+        """
+        Return the uint32 buffers used by the composite_premultiplied method.
+        """
+        
+        if self._wide is None:
+            shape = self.shape
+            self._wide = (np.empty(shape + (4,), dtype=np.uint32),
+                          np.empty(shape + (1,), dtype=np.uint32),
+                          np.empty(shape + (4,), dtype=np.uint32))
+        
+        return self._wide
+
+
 class Frame(object):
     """
     Image frame for displaying on the Sense Hat.
@@ -12,12 +346,21 @@ class Frame(object):
     of the second frame to show through. In this way it is possible to draw a
     complex image by combining a number of simpler images.
     
+    The values are kept in a single 8x8x4 uint8 array, self.rgba, with the
+    alpha values in the last channel. The rgb and alpha attributes are views
+    of this array rather than copies.
+    
     Methods:
     --------
+    from_rgba - Create a Frame that uses an existing 8x8x4 array.
+    to_array  - Return the red, green and blue values as an 8x8x3 array.
     to_list   - Return the red, green and blue values as a 64 element list.
     __add__   - Overridden add method to add 2 frames together.
     __radd__  - Overridden add method to add 2 frames together.
     """
+    
+    __slots__ = ('rgba',)
+    
     def __init__(self, image_rgb, image_alpha):
         
         # Check that inputs are numpy arrays
@@ -35,10 +378,43 @@ class Frame(object):
             raise ValueError("dimensions of image_alpha should be 8x8")
             
         
-        self.rgb   = image_rgb
+        self.rgba = np.empty((8, 8, 4), dtype=np.uint8)
+        self.rgba[:,:,:3] = image_rgb
+        self.rgba[:,:,3]  = image_alpha
+        
+    
+    @classmethod
+    def from_rgba(cls, rgba):
+        """
+        Create a Frame from an 8x8x4 uint8 array of rgb and alpha values.
+        
+        The array is used as it is rather than copied, so it should not be
+        changed afterwards.
+        """
+        
+        if type(rgba) != np.ndarray:
+            raise TypeError("Input rgba should be a numpy array")
+        
+        if rgba.shape != (8,8,4) or rgba.dtype != np.uint8:
+            raise ValueError("rgba should be an 8x8x4 uint8 array")
+        
+        frame = cls.__new__(cls)
+        frame.rgba = rgba
+        
+        return frame
+        
+    
+    @property
+    def rgb(self):
+        
+        return self.rgba[:,:,:3]
+        
+    
+    @property
+    def alpha(self):
+        
+        return self.rgba[:,:,3]
         
-        # Resize alpha into 8x8x3 (same size as rgb)
-        self.alpha = np.repeat( image_alpha[:,:,np.newaxis],3,axis=2)
         
     def __add__(self, other):
         """
@@ -51,23 +427,10 @@ class Frame(object):
         if other.__class__ != Frame:
             raise TypeError
         
-        # Calculate the alpha for both frames
-        alpha1 = self.alpha
-        alpha2 = np.uint8( other.alpha * ((255 - self.alpha) / 255) )
-        alpha_total = alpha1 + alpha2
-        
-        # identify non-zero alpha values (to prevent division by zero later)
-        alpha_nz = alpha_total != 0
+        # Stack both frames as RGBA layers, front-most first
+        layers = np.stack((self.rgba, other.rgba))
         
-        # Calculate rgb of both frames
-        rgb_total = np.zeros((8, 8, 3), dtype=np.uint8)
-        rgb_total[alpha_nz] += (
-            self.rgb[alpha_nz]  * (alpha1[alpha_nz] / alpha_total[alpha_nz]) )
-        rgb_total[alpha_nz] += (
-            other.rgb[alpha_nz] * (alpha2[alpha_nz] / alpha_total[alpha_nz]) )
-        
-        
-        return Frame(rgb_total, alpha_total[:,:,1])
+        return Frame.from_rgba(composite(layers))
         
     
     def __radd__(self, other):
@@ -81,6 +444,24 @@ class Frame(object):
             return self.__add__(other)
             
     
+    def to_array(self, use_alpha=True):
+        """
+        Return the red, green and blue values as an 8x8x3 uint8 array.
+        
+        Inputs:
+        -------
+        use_alpha - Set to True to multiply the rgb values by the stored alpha
+                    values before returning the array. Set to False to return
+                    rgb values with no additional multiplying.
+        """
+        
+        if use_alpha:
+            return np.uint8(self.rgb * (self.rgba[:,:,3:]/255))
+            
+        else:
+            return self.rgb
+        
+    
     def to_list(self, use_alpha=True):
         """
         Return the red, green and blue values as a 64 element list.
@@ -96,13 +477,115 @@ class Frame(object):
                     rgb values with no additional multiplying.
         """
         
-        if use_alpha:
-            values  = np.uint8(self.rgb  * (self.alpha/255))
-            
+        values = self.to_array(use_alpha)
+        
+        return values.reshape(64,3).tolist()
+
+
+class PremultipliedFrame(object):
+    """
+    Image frame stored as integer premultiplied rgb and alpha values.
+    
+    A PremultipliedFrame behaves in the same way as a Frame, but keeps a single
+    8x8x4 uint8 array where the rgb values have already been multiplied by the
+    alpha values. Adding frames together is then carried out entirely with
+    integer arithmetic, which is considerably cheaper than the floating point
+    calculations of the Frame class. Adding two frames rounds the result to
+    the nearest integer rather than down, so it may be slightly brighter than
+    that of the equivalent Frames. To combine many layers with only a single
+    rounding, use the composite_premultiplied function rather than adding
+    frames one at a time.
+    
+    Methods:
+    --------
+    from_frame - Create a PremultipliedFrame from the values of a Frame.
+    to_array   - Return the red, green and blue values as an 8x8x3 array.
+    to_list    - Return the red, green and blue values as a 64 element list.
+    __add__    - Overridden add method to add 2 frames together.
+    __radd__   - Overridden add method to add 2 frames together.
+    """
+    
+    __slots__ = ('rgba',)
+    
+    def __init__(self, rgba):
+        
+        if type(rgba) != np.ndarray:
+            raise TypeError("Input rgba should be a numpy array")
+        
+        if rgba.shape != (8,8,4):
+            raise ValueError("dimensions of rgba should be 8x8x4")
+        
+        self.rgba = rgba
+        
+    
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        Create a PremultipliedFrame from the rgb and alpha values of a Frame.
+        """
+        
+        return cls(premultiply(frame.rgba))
+        
+    
+    def __add__(self, other):
+        """
+        Overridden add method that can sum two PremultipliedFrame objects.
+        
+        The first image in the sum will be displayed in front of the second.
+        """
+        if other.__class__ != PremultipliedFrame:
+            raise TypeError
+        
+        layers = np.stack((self.rgba, other.rgba))
+        
+        return PremultipliedFrame(composite_premultiplied(layers))
+        
+    
+    def __radd__(self, other):
+        """
+        Overridden right add method that uses new add method.
+        """
+        
+        if other == 0:
+            return self
         else:
-            values  = self.rgb
+            return self.__add__(other)
             
-        values = values.reshape(64,3)
+    
+    def to_array(self, use_alpha=True):
+        """
+        Return the red, green and blue values as an 8x8x3 uint8 array.
         
-        return values.tolist()
-            
+        Inputs:
+        -------
+        use_alpha - Set to True to return the rgb values multiplied by alpha,
+                    as they are stored. Set to False to divide the stored
+                    values by alpha to recover the original rgb values.
+        """
+        
+        if use_alpha:
+            return self.rgba[:,:,:3]
+        
+        # Divide by alpha, rounding to the nearest integer
+        alpha  = self.rgba[:,:,3:].astype(np.uint32)
+        values = self.rgba[:,:,:3] * np.uint32(255) + alpha // 2
+        np.floor_divide(values, alpha, out=values, where=alpha != 0)
+        values[np.broadcast_to(alpha == 0, values.shape)] = 0
+        
+        return np.minimum(values, 255).astype(np.uint8)
+        
+    
+    def to_list(self, use_alpha=True):
+        """
+        Return the red, green and blue values as a 64 element list.
+        
+        Inputs:
+        -------
+        use_alpha - Set to True to return the rgb values multiplied by alpha,
+                    as they are stored. Set to False to divide the stored
+                    values by alpha to recover the original rgb values.
+        """
+        
+        values = self.to_array(use_alpha)
+        
+        return values.reshape(64,3).tolist()
@@ -0,0 +1,179 @@
+from __future__ import absolute_import
+import glob
+import mmap
+import os
+import numpy as np
+from .display import DisplayBackend
+
+
+SENSE_HAT_FB_NAME = 'RPi-Sense FB'
+
+# Number of bytes in the Sense Hat framebuffer: 64 pixels of 16 bits each
+FRAMEBUFFER_BYTES = 128
+
+
+def find_framebuffer():
+    """
+    Return the path of the Sense Hat framebuffer device.
+
+    Searches the framebuffer devices in the same way as the SenseHat class,
+    returning the /dev path of the device named 'RPi-Sense FB', or None if no
+    such device can be found.
+    """
+
+    for fb in glob.glob('/sys/class/graphics/fb*'):
+        name_file = os.path.join(fb, 'name')
+
+        if os.path.isfile(name_file):
+            with open(name_file, 'r') as f:
+                name = f.read()
+
+            if name.strip() == SENSE_HAT_FB_NAME:
+                fb_device = fb.replace(os.path.dirname(fb), '/dev')
+                if os.path.exists(fb_device):
+                    return fb_device
+
+    return None
+
+
+def pack_rgb565(pixels, rotation=0):
+    """
+    Pack an image into the 16 bit RGB565 values used by the framebuffer.
+
+    Returns an 8x8 uint16 array in the order that the values are stored in
+    the framebuffer, with the image rotated in the same way as the SenseHat
+    class' set_pixels method.
+
+    Inputs:
+    -------
+    pixels   - 8x8x3 array (or 64x3 array or list) of rgb values between 0
+               and 255.
+    rotation - The rotation of the display in degrees. Must be 0, 90, 180 or
+               270.
+    """
+
+    if rotation not in (0, 90, 180, 270):
+        raise ValueError("Rotation must be 0, 90, 180 or 270 degrees")
+
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(8,8,3)
+
+    # Rotating the display clockwise is a transpose and flip of the image
+    pixels = np.rot90(pixels, -rotation // 90)
+
+    red   = pixels[:,:,0] >> 3
+    green = pixels[:,:,1] >> 2
+    blue  = pixels[:,:,2] >> 3
+
+    packed = red.astype(np.uint16) << 11
+    packed |= green.astype(np.uint16) << 5
+    packed |= blue
+
+    return packed
+
+
+class FramebufferOutput(DisplayBackend):
+    """
+    Writes images directly to the Sense Hat's memory-mapped framebuffer.
+
+    Images are packed into RGB565 values using numpy and all 128 bytes of the
+    framebuffer are written at once, avoiding the conversion to lists and the
+    per-pixel checks and writes of the SenseHat class' set_pixels method. Any
+    file may be used in place of the framebuffer device, which allows the
+    output to be used without a Sense Hat. The rotation of the display can be
+    changed by setting self.rotation.
+
+    Methods:
+    --------
+    write         - Write an 8x8x3 image to the framebuffer.
+    write_changed - Write only the pixels of an image that have changed.
+    close         - Release the framebuffer.
+    """
+
+    supports_partial = True
+
+
+    def __init__(self, path=None, rotation=0):
+        """
+        Initialise the output by opening and mapping the framebuffer.
+
+        Inputs:
+        -------
+        path     - The path of the framebuffer device or file. If None, the
+                   Sense Hat framebuffer device is found automatically.
+                   Regular files shorter than 128 bytes are extended.
+        rotation - The default rotation of the display in degrees.
+        """
+
+        if path is None:
+            path = find_framebuffer()
+
+            if path is None:
+                raise OSError("Cannot detect %s device" % SENSE_HAT_FB_NAME)
+
+        self.path     = path
+        self.rotation = rotation
+
+        self._file = open(path, 'r+b')
+
+        if (os.path.isfile(path) and
+                os.path.getsize(path) < FRAMEBUFFER_BYTES):
+            self._file.truncate(FRAMEBUFFER_BYTES)
+
+        self._mmap   = mmap.mmap(self._file.fileno(), FRAMEBUFFER_BYTES)
+        self._buffer = np.ndarray((8,8), dtype=np.uint16, buffer=self._mmap)
+
+
+    def __repr__(self):
+
+        return self.__class__.__name__ + '("' + self.path + '")'
+
+
+    def write(self, pixels, rotation=None):
+        """
+        Write an image to the framebuffer.
+
+        Inputs:
+        -------
+        pixels   - 8x8x3 array (or 64x3 array or list) of rgb values between
+                   0 and 255.
+        rotation - The rotation of the display in degrees. If None, the
+                   rotation given when creating the output is used.
+        """
+
+        if rotation is None:
+            rotation = self.rotation
+
+        self._buffer[...] = pack_rgb565(pixels, rotation)
+
+
+    def write_changed(self, pixels, changed, rotation=None):
+        """
+        Write an image to the framebuffer, only writing the 16 bit values of
+        the pixels that differ from those already in the framebuffer.
+
+        The changed input, marking the pixels which differ from the last frame,
+        is accepted for compatibility with other backends, but the values are
+        compared with the framebuffer itself, so that the rotation is taken
+        into account.
+        """
+
+        if rotation is None:
+            rotation = self.rotation
+
+        packed = pack_rgb565(pixels, rotation)
+        differ = packed != self._buffer
+
+        self._buffer[differ] = packed[differ]
+
+
+    def close(self):
+        """
+        Release the framebuffer. The output cannot be used once closed.
+        """
+
+        if self._mmap is not None:
+            # The array must be released before the map can be closed
+            self._buffer = None
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
@@ -1,7 +1,9 @@
 from __future__ import absolute_import
+from math import gcd
 import numpy as np
 from .frame import Frame
 
+
 class ImageLayer(object):
     """
     Base image layer class.
@@ -9,23 +11,50 @@ class ImageLayer(object):
     The ImageLayer class is a base class which is used for creating a new layer
     of imagery to display on the Sense Hat LED matrix. It contains the red,
     green and blue (rgb) values as well as the alpha values.
+    
+    The values are kept in a single 8x8x4 uint8 array, self.rgba, with the
+    alpha values in the last channel. The rgb and alpha attributes are views
+    of this array, so changing them changes the layer.
     """
     
+    __slots__ = ('rgba', 'name', 'num_frames')
+    
     def __init__(self, rgb, alpha, name="Layer 1"):
         
-        # Convert rgb and alpha to numpy arrays
-        rgb   = np.array(rgb, dtype = np.uint8)
-        alpha = np.array(alpha, dtype = np.uint8)
-        
-        # Reshape from 64x3 to 8x8x3
-        self.rgb   = rgb.reshape(8,8,3)
-        self.alpha = alpha.reshape(8,8)
+        # Reshape from 64x3 to 8x8x3 and store alongside the alpha values
+        self.rgba = np.empty((8, 8, 4), dtype=np.uint8)
+        self.rgba[:,:,:3] = np.reshape(rgb, (8,8,3))
+        self.rgba[:,:,3]  = np.reshape(alpha, (8,8))
         
         self.num_frames = 1
 
         self.name  = name
     
     
+    @property
+    def rgb(self):
+        
+        return self.rgba[:,:,:3]
+    
+    
+    @rgb.setter
+    def rgb(self, rgb):
+        
+        self.rgba[:,:,:3] = np.reshape(rgb, self.rgba[:,:,:3].shape)
+    
+    
+    @property
+    def alpha(self):
+        
+        return self.rgba[:,:,3]
+    
+    
+    @alpha.setter
+    def alpha(self, alpha):
+        
+        self.rgba[:,:,3] = np.reshape(alpha, self.rgba.shape[:2])
+    
+    
     def __getitem__(self, idx):
         """
         Return the frame at index idx.
@@ -44,9 +73,7 @@ class ImageLayer(object):
         else:
             frame_num = idx
         
-        rgb, alpha = self.get_pixels(frame_num)
-        
-        return Frame(rgb, alpha)
+        return Frame.from_rgba(np.array(self.get_rgba(frame_num)))
     
     
     def __repr__(self):
@@ -54,12 +81,52 @@ class ImageLayer(object):
         return self.__class__.__name__ + '("' + self.name + '")'
     
     
-    def get_pixels(self, frame_num=0):
+    def get_pixels(self, frame_num=0, out=None):
         """
         Returns the rgb and alpha values for frame frame_num of the layer.
+        
+        If out, an 8x8x4 uint8 array, is given, the values are written to it
+        and the rgb and alpha values returned are views of it.
         """
         
-        return (self.rgb, self.alpha)
+        rgba = self.get_rgba(frame_num, out)
+        
+        return (rgba[:,:,:3], rgba[:,:,3])
+    
+    
+    def get_rgba(self, frame_num=0, out=None):
+        """
+        Returns the rgb and alpha values for frame frame_num of the layer as
+        a single 8x8x4 array, with the alpha values in the last channel.
+        
+        The array returned may be a view of values kept by the layer, so it
+        should not be changed. If out, an 8x8x4 uint8 array, is given, the
+        values are written to it and it is returned instead, so that frames
+        can be rendered without creating new arrays.
+        """
+        
+        if out is None:
+            return self.rgba
+        
+        np.copyto(out, self.rgba)
+        
+        return out
+        
+    
+    def get_rgba_frames(self, frame_nums):
+        """
+        Returns the rgba values for several frames of the layer at once.
+        
+        Inputs:
+        -------
+        frame_nums - 1D array of the frame numbers to return.
+        
+        Returns an Fx8x8x4 array, with one 8x8x4 array of values for each of
+        the F frame numbers given. The array returned may be a view of values
+        kept by the layer, so it should not be changed.
+        """
+        
+        return np.broadcast_to(self.rgba, (len(frame_nums), 8, 8, 4))
         
         
     def get_name(self):
@@ -67,6 +134,29 @@ class ImageLayer(object):
         return self.name
         
     
+    def clear_cache(self):
+        """
+        Remove any values that have been cached from the layer's pixels.
+        
+        Layers do not expect their pixels to change once created. Call this
+        method after modifying the rgb or alpha values of a layer directly.
+        """
+        
+        pass
+        
+    
+    def compile(self):
+        """
+        Return a CompiledLayer with every frame of this layer precomputed.
+        
+        The effects applied to the layer are evaluated once for each of its
+        len(self) frames, after which getting the pixels of a frame is a
+        single lookup. The frames take up 256 bytes each.
+        """
+        
+        return CompiledLayer(self)
+        
+    
     def __len__(self):
         """
         Return the number of frames for this object.
@@ -82,16 +172,46 @@ class AnimatedLayer(ImageLayer):
     """
     Class for an animated layer. All animated layers should be subclassed off
     this class.
+    
+    Subclasses should override the get_rgba method, or the get_pixels method.
+    Both are given an optional 8x8x4 uint8 array, out, to write the values of
+    the frame to.
     """
     
+    __slots__ = ('image_layer',)
+    
     def __init__(self, image_layer):
         
         self.image_layer = image_layer
+        self.num_frames  = len(image_layer)
     
     
-    def get_pixels(self, frame_num=0):
+    def get_pixels(self, frame_num=0, out=None):
         
-        return self.image_layer.get_pixels()
+        return self.image_layer.get_pixels(frame_num, out)
+    
+    
+    def get_rgba(self, frame_num=0, out=None):
+        
+        rgb, alpha = self.get_pixels(frame_num)
+        
+        if out is None:
+            out = np.empty((8, 8, 4), dtype=np.uint8)
+        
+        out[:,:,:3] = rgb
+        out[:,:,3]  = alpha
+        
+        return out
+    
+    
+    def get_rgba_frames(self, frame_nums):
+        
+        # Subclasses should override this with a vectorised version
+        frames = np.empty((len(frame_nums), 8, 8, 4), dtype=np.uint8)
+        for idx, frame_num in enumerate(frame_nums):
+            frames[idx] = self.get_rgba(frame_num)
+        
+        return frames
         
         
     def get_name(self):
@@ -99,6 +219,21 @@ class AnimatedLayer(ImageLayer):
         return self.image_layer.get_name()
     
     
+    def clear_cache(self):
+        
+        # The inner layer's number of frames may have changed too
+        self.image_layer.clear_cache()
+        self.num_frames = self._get_num_frames()
+    
+    
+    def _get_num_frames(self):
+        """
+        Return the number of frames before the layer repeats itself.
+        """
+        
+        return len(self.image_layer)
+    
+    
     def __repr__(self):
         
         inner_brackets = self.image_layer.__repr__()
@@ -110,6 +245,8 @@ class ScrollingLayer(AnimatedLayer):
     Layer that scrolls from left to right across the screen.
     """
     
+    __slots__ = ('axis', 'shift_dir', 'padding', '_strips')
+    
     def __init__(self, image_layer, direction='E', padding=0):
         """
         Initialise the ScrollingLayer with direction and padding.
@@ -130,11 +267,9 @@ class ScrollingLayer(AnimatedLayer):
         AnimatedLayer.__init__(self, image_layer)
         
         if direction in ('N','S'):
-            self.padding = np.zeros((padding, 8, 3), dtype=np.uint8)
             self.axis = 0
             
         elif direction in ('E','W'):
-            self.padding = np.zeros((8, padding, 3), dtype=np.uint8)
             self.axis = 1
             
         
@@ -145,24 +280,119 @@ class ScrollingLayer(AnimatedLayer):
             self.shift_dir = -1
             
         
-        self.num_frames = 8 + padding
+        self.padding    = padding
+        self.num_frames = self._get_num_frames()
+        
+        # Padded strips of the inner layer, indexed by its frame number
+        self._strips = {}
+        
+    
+    def clear_cache(self):
         
+        self._strips.clear()
+        AnimatedLayer.clear_cache(self)
         
-    def get_pixels(self, frame_num=0):
+    
+    def _get_num_frames(self):
+        
+        # The scroll and the inner layer's animation both repeat once the
+        # number of frames is a multiple of both of their lengths
+        return _lcm(8 + self.padding, len(self.image_layer))
+        
+        
+    def get_pixels(self, frame_num=0, out=None):
         """
         Returns the rgb and alpha values for frame frame_num of the layer.
         """
         
-        rgb, alpha = self.image_layer.get_pixels(frame_num)
+        return ImageLayer.get_pixels(self, frame_num, out)
+        
+        
+    def get_rgba(self, frame_num=0, out=None):
+        """
+        Returns the rgba values for frame frame_num of the layer.
+        
+        The values returned are a read-only view of a strip containing the
+        padded image twice over, so that every position of the scroll can be
+        taken as an 8x8 window of the strip without copying any values. If
+        out is given, the window is copied to it instead.
+        """
+        
+        strip = self._get_strip(frame_num % len(self.image_layer))
         
-        rgb   = np.concatenate((rgb,   self.padding), axis=self.axis)
-        alpha = np.concatenate((alpha, self.padding[:,:,1]), axis=self.axis)
+        # Shifting the image by one pixel moves the window back by one
+        start = (-self.shift_dir * frame_num) % (8 + self.padding)
         
-        shift = self.shift_dir * frame_num
-        rgb   = np.roll(rgb,   shift, self.axis)
-        alpha = np.roll(alpha, shift, self.axis)
+        if self.axis == 0:
+            window = strip[start:start+8,:,:]
+        else:
+            window = strip[:,start:start+8,:]
         
-        return (rgb[:8,:8,:], alpha[:8,:8])
+        if out is not None:
+            np.copyto(out, window)
+            return out
+        
+        return window
+        
+    
+    def get_rgba_frames(self, frame_nums):
+        """
+        Returns the rgba values for several frames of the layer at once.
+        
+        The padded image of each frame of the inner layer that is needed is
+        created once, and every frame is then gathered from these with a
+        single fancy index.
+        """
+        
+        frame_nums = np.asarray(frame_nums)
+        length = 8 + self.padding
+        
+        inner_nums, inverse = np.unique(frame_nums % len(self.image_layer),
+                                        return_inverse=True)
+        
+        padded_shape = [len(inner_nums), 8, 8, 4]
+        padded_shape[self.axis + 1] += self.padding
+        
+        padded = np.zeros(padded_shape, dtype=np.uint8)
+        padded[:,:8,:8,:] = self.image_layer.get_rgba_frames(inner_nums)
+        
+        # Position along the scroll axis of each row or column of each frame
+        start = (-self.shift_dir * frame_nums) % length
+        index = (start[:,np.newaxis] + np.arange(8)) % length
+        
+        inverse = inverse.reshape(-1, 1, 1)
+        
+        if self.axis == 0:
+            return padded[inverse, index[:,:,np.newaxis], np.arange(8)]
+        else:
+            return padded[inverse, np.arange(8)[:,np.newaxis],
+                          index[:,np.newaxis,:]]
+        
+    
+    def _get_strip(self, inner_frame):
+        """
+        Return the padded, wrap-around strip for a frame of the inner layer.
+        
+        Strips are created the first time each frame of the inner layer is
+        needed, so the work done is proportional to the number of frames in
+        the inner layer rather than the number of frames displayed.
+        """
+        
+        strip = self._strips.get(inner_frame)
+        
+        if strip is None:
+            padded_shape = [8, 8, 4]
+            padded_shape[self.axis] += self.padding
+            
+            padded = np.zeros(padded_shape, dtype=np.uint8)
+            padded[:8,:8,:] = self.image_layer.get_rgba(inner_frame)
+            
+            strip = np.concatenate((padded, padded), axis=self.axis)
+            strip.flags.writeable = False
+            
+            self._strips[inner_frame] = strip
+        
+        return strip
         
 
 
@@ -171,6 +401,8 @@ class FlashingLayer(AnimatedLayer):
     Layer that can flash on and off in a specified sequence.
     """
     
+    __slots__ = ('flash_sequence', '_alpha')
+    
     def __init__(self, image_layer, flash_sequence=[255,0]):
         """
         Initialise the ScrollingLayer with direction and padding.
@@ -190,22 +422,155 @@ class FlashingLayer(AnimatedLayer):
         AnimatedLayer.__init__(self, image_layer)
                  
         self.flash_sequence = flash_sequence
-        self.num_frames     = len(flash_sequence)
+        self.num_frames     = self._get_num_frames()
+        
+        # Floating point alpha values, reused when scaling each frame
+        self._alpha = np.empty((8, 8))
         
     
-    def get_pixels(self, frame_num=0):
+    def _get_num_frames(self):
+        
+        return _lcm(len(self.flash_sequence), len(self.image_layer))
+        
+    
+    def get_pixels(self, frame_num=0, out=None):
         """
         Returns the rgb and alpha values for frame frame_num of the layer.
         """
         
-        rgb, alpha = self.image_layer.get_pixels(frame_num)
+        return ImageLayer.get_pixels(self, frame_num, out)
+        
+    
+    def get_rgba(self, frame_num=0, out=None):
+        """
+        Returns the rgba values for frame frame_num of the layer.
+        
+        The values of the inner layer are written to out, or to a new array
+        if out is not given, and their alpha values scaled in place.
+        """
+        
+        if out is None:
+            out = np.empty((8, 8, 4), dtype=np.uint8)
+        
+        rgba = self.image_layer.get_rgba(frame_num, out)
         
         # Get the intensity of the rgb image
         flash_idx = frame_num % len(self.flash_sequence)
         intensity = self.flash_sequence[flash_idx]     
         
-        alpha = np.uint8( alpha * (intensity/255) )
+        # Scale the alpha values as floating point, then round them down
+        alpha = self._alpha
+        np.copyto(alpha, rgba[:,:,3])
+        np.multiply(alpha, intensity/255, out=alpha)
+        np.copyto(rgba[:,:,3], alpha, casting='unsafe')
+        
+        return rgba
+        
+    
+    def get_rgba_frames(self, frame_nums):
+        """
+        Returns the rgba values for several frames of the layer at once.
+        """
         
-        return (rgb, alpha)
+        frame_nums = np.asarray(frame_nums)
         
+        rgba = np.array(self.image_layer.get_rgba_frames(frame_nums))
         
+        # Intensity of each frame, broadcast over its alpha values
+        sequence  = np.asarray(self.flash_sequence)
+        intensity = sequence[frame_nums % len(sequence)] / 255
+        
+        np.multiply(rgba[...,3], intensity[:,np.newaxis,np.newaxis],
+                    out=rgba[...,3], casting='unsafe')
+        
+        return rgba
+
+
+class CompiledLayer(AnimatedLayer):
+    """
+    Layer holding every frame of another layer, precomputed.
+    
+    When a CompiledLayer is created, the layer it wraps (including any effects
+    applied to it) is evaluated for each frame of its period, and the results
+    are stored in a single read-only Px8x8x4 uint8 array, self.frames. Getting
+    the pixels of a frame is then a lookup in this array, however many effects
+    were applied. Create a CompiledLayer using a layer's compile method.
+    """
+    
+    __slots__ = ('frames',)
+    
+    def __init__(self, image_layer):
+        """
+        Initialise the CompiledLayer by evaluating every frame of image_layer.
+        
+        Inputs:
+        -------
+        image_layer   - The layer to compile. This can be either an ImageLayer
+                        object, or a subclass of it.
+        """
+        
+        AnimatedLayer.__init__(self, image_layer)
+        
+        self.frames = None
+        self._compile()
+        
+    
+    def clear_cache(self):
+        """
+        Evaluate the frames of the wrapped layer again.
+        """
+        
+        AnimatedLayer.clear_cache(self)
+        self._compile()
+        
+    
+    def compile(self):
+        
+        return self
+        
+    
+    def get_pixels(self, frame_num=0, out=None):
+        """
+        Returns the rgb and alpha values for frame frame_num of the layer.
+        """
+        
+        return ImageLayer.get_pixels(self, frame_num, out)
+        
+    
+    def get_rgba(self, frame_num=0, out=None):
+        """
+        Returns a read-only view of the rgba values for frame frame_num, or
+        copies them to out if it is given.
+        """
+        
+        if out is None:
+            return self.frames[frame_num % self.num_frames]
+        
+        np.copyto(out, self.frames[frame_num % self.num_frames])
+        
+        return out
+        
+    
+    def get_rgba_frames(self, frame_nums):
+        
+        return self.frames[np.asarray(frame_nums) % self.num_frames]
+        
+    
+    def _compile(self):
+        
+        self.num_frames = len(self.image_layer)
+        
+        frames = np.empty((self.num_frames, 8, 8, 4), dtype=np.uint8)
+        for frame_num in range(self.num_frames):
+            frames[frame_num] = self.image_layer.get_rgba(frame_num)
+        
+        frames.flags.writeable = False
+        self.frames = frames
+
+
+def _lcm(a, b):
+    """
+    Return the lowest common multiple of two positive integers.
+    """
+    
+    return a * b // gcd(a, b)
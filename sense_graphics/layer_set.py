@@ -1,5 +1,25 @@
 from __future__ import absolute_import
-from .image_layer import ImageLayer, ScrollingLayer, FlashingLayer
+from collections import OrderedDict
+import sys
+import numpy as np
+from .animation_file import save_animation
+from .frame import Frame, PremultipliedFrame, Compositor, composite
+from .frame import composite_premultiplied, premultiply
+from .image_layer import ImageLayer, AnimatedLayer, CompiledLayer
+from .image_layer import ScrollingLayer, FlashingLayer, _lcm
+from .text_layer import TextLayer
+from .transition import Transition
+
+
+# Approximate memory used by one cached frame: the 8x8x3 uint8 array plus the
+# 64 element list of 3 element lists returned by LayerSet.__getitem__, which
+# is only made once the frame is first requested as a list
+_CACHED_FRAME_BYTES = (
+    192 + sys.getsizeof([None]*64) + 64 * sys.getsizeof([0, 0, 0]) )
+
+# Number of frames combined at once by LayerSet.render_frames. Combining
+# uses about 32 bytes per pixel of every layer of each frame in the batch
+_BATCH_FRAMES = 256
 
 
 class LayerSet(object):
@@ -11,27 +31,124 @@ class LayerSet(object):
     to retrieve lists that combine the layers together. These lists can be
     shown on the Sense Hat using the SenseHat class' set_pixels() method.
     
+    As every layer loops around after len(layer) frames, the combined image
+    repeats itself every len(layer_set) frames. Frames are therefore cached
+    once they have been created, so that looping animations are only computed
+    once. The cache is cleared whenever layers or effects are added, and is
+    limited in size so that animations with a very long period do not use up
+    all of the available memory. Note that the lists and arrays returned are
+    shared with the cache, and should not be modified.
+    
+    To find out how long each stage of creating a frame takes, assign a
+    RenderStats object (see the profiling module) to self.stats.
+    
+    To adjust the brightness, gamma or colour temperature of the frames,
+    assign a ColourLUT object (see the colour_lut module) to self.colour.
+    The correction is applied as frames are returned, after the cache, so
+    the settings can be changed at any time without clearing the cache.
+    
     Methods:
     --------
+    render               - Return the rgb values of a frame as an array.
+    render_into          - Write the rgb values of a frame to an array.
+    render_frames        - Return the rgb values of many frames as an array.
+    clear_cache          - Remove all cached frames.
+    export               - Save the animation to an animation file.
     add_layer            - Add an extra layer to the image.
+    append_layer         - Add an existing layer object to the image.
+    add_text_layer       - Add a layer of scrolling text to the image.
+    set_text             - Change the text shown by a text layer.
     add_effect_scrolling - Add a scrolling effect to a layer.
     add_effect_flashing  - Add a flashing effect to a layer.
+    compile_effects      - Precompute the frames of layers with effects.
+    transition_to        - Create a transition from this image to another.
     """
     
-    def __init__(self, name="New Image"):
+    def __init__(self, name="New Image", cache_frames=None,
+                 cache_bytes=2097152, fixed_point=False,
+                 flatten_static='leading'):
         """
-        Initialise the class with a name.
+        Initialise the class with a name and the limits of the frame cache.
+        
+        Inputs:
+        -------
+        name         - The name of the image.
+        cache_frames - The maximum number of frames to keep in the cache, or
+                       None for no limit on the number of frames.
+        cache_bytes  - The approximate maximum memory in bytes to be used by
+                       the cache, or None for no limit. Once either limit is
+                       reached the least recently used frames are discarded.
+                       If the animation has more frames than the cache can
+                       hold, only its first frames are cached, as playing it
+                       in a loop would discard every frame before it is
+                       shown again. Set either limit to 0 to disable the
+                       cache.
+        fixed_point  - Set to True to combine layers using integer
+                       premultiplied alpha values (see PremultipliedFrame).
+                       This is faster, and as the values are only rounded
+                       once they are within 2 units of the exact result
+                       however many layers there are. Combining in floating
+                       point rounds down after every layer, so gives values
+                       up to about 4 units darker with 2 layers, 11 with 8
+                       and 16 with 20.
+        flatten_static - Which runs of adjacent layers that do not animate
+                       to combine into a single layer ahead of time, so
+                       that fewer layers are combined for each frame. The
+                       default, 'leading', only combines the layers in
+                       front of the front-most animated layer, which gives
+                       exactly the same frames. With fixed_point, which
+                       keeps fractions of a unit while combining, rounding
+                       a run would change the frames, so 'leading' combines
+                       no layers ahead of time. Set to True to also combine
+                       the runs behind animated layers, which is faster for
+                       scenes with many static layers, but as each run is
+                       rounded separately frames may differ by a few units.
+                       Set to False to combine every layer for every frame.
         """
         
         self.layers = []
         self.name   = name
         
+        self.fixed_point    = fixed_point
+        self.flatten_static = flatten_static
+        
+        self.cache_frames = cache_frames
+        self.cache_bytes  = cache_bytes
+        
+        self._cache  = OrderedDict()
+        self._period = None
+        
+        # Layers combined for each frame, with static runs flattened (see
+        # _get_flattened), and the layers and settings they were made from
+        self._flattened     = None
+        self._flattened_key = None
+        
+        # Arrays reused to combine each frame (see _compose)
+        self._buffers = None
+        
+        self.stats  = None
+        self.colour = None
+        
     
     def __repr__(self):
         
         return self.__class__.__name__ + '("' + self.name + '")'
     
     
+    def __getstate__(self):
+        
+        # Cached frames can be created again, so are not copied when the
+        # LayerSet is sent to another process
+        state = self.__dict__.copy()
+        state['_cache']         = OrderedDict()
+        state['_flattened']     = None
+        state['_flattened_key'] = None
+        state['_buffers']       = None
+        state['stats']          = None
+        
+        return state
+    
+    
     def __getitem__(self, idx):
         """
         Return a list of rgb values at index idx.
@@ -44,9 +161,291 @@ class LayerSet(object):
         class.
         """
         
-        frame = self._create_frame(idx)
+        entry = self._get_cached_frame(idx)
+        
+        if self.colour is not None:
+            values = self.colour.apply(entry[0])
+            return values.reshape(64,3).tolist()
+        
+        # Only frames used as lists are converted to lists
+        if entry[1] is None:
+            entry[1] = entry[0].reshape(64,3).tolist()
+        
+        return entry[1]
+    
+    
+    def __len__(self):
+        """
+        Return the number of frames before the image repeats itself.
+        
+        Overrides the built-in __len__ method to instead return the lowest
+        common multiple of the number of frames in each layer.
+        """
+        
+        if self._period is None:
+            period = 1
+            for layer in self.layers:
+                period = _lcm(period, len(layer))
+            
+            self._period = period
+        
+        return self._period
+    
+    
+    def render(self, frame_num):
+        """
+        Return the rgb values of frame frame_num as an 8x8x3 uint8 array.
+        
+        The values are the same as those returned by __getitem__, and have
+        already been multiplied by the combined alpha values of the layers.
+        """
+        
+        values = self._get_cached_frame(frame_num)[0]
+        
+        if self.colour is not None:
+            return self.colour.apply(values)
+        
+        return values
+    
+    
+    def render_into(self, frame_num, out):
+        """
+        Write the rgb values of frame frame_num to an 8x8x3 uint8 array.
+        
+        The values are the same as those returned by render, but are written
+        to an array owned by the caller rather than returned. Frames are
+        taken from the cache as usual, but frames that are not cached (e.g.
+        with cache_bytes=0) are combined using buffers kept by the LayerSet,
+        and so once the buffers have been created no new arrays or lists are
+        made for each frame (other than a temporary array for the ColourLUT,
+        if self.colour is set). This avoids the pauses of the
+        garbage collector in programs that run for a long time. numpy still
+        uses a few kilobytes of scratch memory while combining the layers,
+        which it frees straight away. As the buffers are shared, only one
+        thread should render frames at a time.
+        
+        Returns out.
+        """
+        
+        key = frame_num % len(self)
+        
+        if not self._is_cached(key):
+            stats = self.stats
+            if stats is not None:
+                start = stats.timer()
+            
+            rgba = self._compose(key)
+            
+            if self.fixed_point:
+                np.copyto(out, rgba[:,:,:3])
+            else:
+                self._buffers[3].to_array(rgba, out)
+            
+            if stats is not None:
+                stats.record('render', stats.timer() - start)
+        
+        else:
+            np.copyto(out, self._get_cached_frame(frame_num)[0])
+        
+        if self.colour is not None:
+            self.colour.apply(out, out=out)
+        
+        return out
+    
+    
+    def clear_cache(self):
+        """
+        Remove all cached frames.
+        
+        The cache is cleared automatically when layers or effects are added
+        using the methods of this class. Call this method after modifying
+        self.layers or any of the layers directly. If the pixels of a layer
+        have been modified, call the clear_cache method of that layer too.
+        """
+        
+        self._cache.clear()
+        self._period = None
+        
+        self._flattened     = None
+        self._flattened_key = None
+        self._buffers       = None
+    
+    
+    def export(self, path, fps=2, num_frames=None):
+        """
+        Save the frames of the animation to an animation file.
+        
+        The saved file can be displayed using the set_pixels_from_file method
+        of the SenseImage class, or opened as an AnimationFile object, without
+        having to create the layers again. Frames are written to the file as
+        they are created, so the memory used does not depend on the number of
+        frames.
+        
+        Inputs:
+        -------
+        path       - The path of the file to create.
+        fps        - The number of frames per second to play the animation at.
+        num_frames - The number of frames to save. Defaults to len(self), one
+                     full period of the animation.
+        """
+        
+        if num_frames is None:
+            num_frames = len(self)
+        
+        # Create the frames in batches, writing each batch before the next
+        frames = (frame
+                  for start in range(0, num_frames, _BATCH_FRAMES)
+                  for frame in self.render_frames(
+                      start, min(start + _BATCH_FRAMES, num_frames)))
+        
+        save_animation(path, frames, fps)
+        
+    
+    def render_frames(self, start, stop, step=1):
+        """
+        Return the rgb values of a range of frames as an Fx8x8x3 uint8 array.
+        
+        The frames returned are those numbered range(start, stop, step), and
+        have the same values as those returned by the render method. Rather
+        than creating each frame in turn, every layer produces its values for
+        all of the frames at once, and the frames are combined in batches, so
+        that many frames can be created very quickly. The frames are not added
+        to the cache.
+        """
+        
+        frame_nums = np.arange(start, stop, step)
+        period     = len(self)
+        
+        base, animated, rows = self._get_flattened()
+        
+        # Only frames within the period differ, so create each of those once
+        # and gather the requested frames from them
+        if len(frame_nums) > period:
+            unique_nums, inverse = np.unique(frame_nums % period,
+                                             return_inverse=True)
+        else:
+            unique_nums, inverse = frame_nums, None
+        
+        values = np.empty((len(unique_nums), 8, 8, 3), dtype=np.uint8)
+        
+        for batch in range(0, len(unique_nums), _BATCH_FRAMES):
+            nums = unique_nums[batch:batch+_BATCH_FRAMES]
+            
+            layers = np.empty((len(base), len(nums), 8, 8, 4), dtype=np.uint8)
+            layers[:] = base[:,np.newaxis]
+            
+            for row, layer in animated:
+                layers[row] = layer.get_rgba_frames(nums % len(layer))
+            
+            if self.fixed_point:
+                layers[rows] = premultiply(layers[rows])
+                rgba = composite_premultiplied(layers)
+                values[batch:batch+len(nums)] = rgba[...,:3]
+            
+            else:
+                rgba = composite(layers)
+                values[batch:batch+len(nums)] = np.uint8(
+                    rgba[...,:3] * (rgba[...,3:]/255) )
+        
+        if self.colour is not None:
+            self.colour.apply(values, out=values)
+        
+        if inverse is None:
+            return values
+        
+        return values[inverse.reshape(-1)]
+    
+    
+    def _get_cached_frame(self, frame_num):
+        """
+        Return the array and list of rgb values for frame frame_num.
+        
+        Returns a list [values, rgb], where rgb is None until it is first
+        made by __getitem__. Frames are looked up in the cache by their
+        position within the period of the animation. Frames that are not in
+        the cache are created and then added to it if _is_cached allows,
+        discarding the least recently used frames if the cache has grown
+        beyond its limits.
+        """
+        
+        stats = self.stats
+        if stats is not None:
+            start = stats.timer()
+        
+        key = frame_num % len(self)
+        entry = self._cache.pop(key, None)
+        
+        if entry is None:
+            frame = self._create_frame(key)
+            
+            if stats is not None:
+                convert_start = stats.timer()
+            
+            values = frame.to_array()
+            values.flags.writeable = False
+            
+            entry = [values, None]
+            
+            if stats is not None:
+                stats.record('convert', stats.timer() - convert_start)
+            
+            if self._is_cached(key):
+                self._add_to_cache(key, entry)
+        
+        else:
+            # Move the frame to the most recently used end of the cache
+            self._cache[key] = entry
+        
+        if stats is not None:
+            stats.record('render', stats.timer() - start)
+        
+        return entry
+    
+    
+    def _add_to_cache(self, key, entry):
+        """
+        Add a frame to the cache, first discarding the least recently used
+        frames if the cache is full.
+        """
+        
+        max_frames = self._cache_limit()
         
-        return frame.to_list()
+        if max_frames is None or max_frames > 0:
+            while max_frames is not None and len(self._cache) >= max_frames:
+                self._cache.popitem(last=False)
+            
+            self._cache[key] = entry
+    
+    
+    def _is_cached(self, key):
+        """
+        Return whether the frame at position key within the period of the
+        animation should be kept in the cache.
+        
+        When the whole period does not fit in the cache, only the frames at
+        its start are kept. Frames are usually shown in order, so caching
+        every frame as it is shown would discard each frame before it is
+        shown again, costing more than not caching at all.
+        """
+        
+        max_frames = self._cache_limit()
+        
+        return max_frames is None or key < max_frames
+    
+    
+    def _cache_limit(self):
+        """
+        Return the maximum number of frames to keep in the cache, from the
+        cache_frames and cache_bytes limits, or None for no limit.
+        """
+        
+        max_frames = self.cache_frames
+        if self.cache_bytes is not None:
+            budget = self.cache_bytes // _CACHED_FRAME_BYTES
+            if max_frames is None or budget < max_frames:
+                max_frames = budget
+        
+        return max_frames
     
     
     def _get_layer_index(self, layer_name):
@@ -70,17 +469,137 @@ class LayerSet(object):
         
         Return a Frame object for the specified frame number. The rgb values of
         the frame will vary depending on the animations set for the different
-        layers that make up the frame.
+        layers that make up the frame. If self.fixed_point is True then a
+        PremultipliedFrame is returned instead.
         """
         
-        this_layer_frames = []
-        for layer in self.layers:
-            this_layer_frames.append(layer[frame_num])
+        rgba = self._compose(frame_num).copy()
         
+        if self.fixed_point:
+            return PremultipliedFrame(rgba)
         
-        return sum(this_layer_frames)
+        return Frame.from_rgba(rgba)
     
     
+    def _compose(self, frame_num):
+        """
+        Combine the layers of the specified frame using reusable buffers.
+        
+        Returns an 8x8x4 uint8 array of the combined rgb and alpha values,
+        which are premultiplied if self.fixed_point is True. The array is one
+        of the LayerSet's buffers, so is overwritten by the next frame.
+        """
+        
+        stats = self.stats
+        
+        base, animated, rows = self._get_flattened()
+        
+        # Start from the layers that do not animate, already combined, and
+        # fill in the rgb and alpha values of the animated layers. The rows
+        # of static layers are only copied when the layers change
+        buffers = self._buffers
+        if buffers is None or buffers[0] is not base:
+            buffers = self._buffers = (base, base.copy(),
+                                       np.empty((8, 8, 4), dtype=np.uint8),
+                                       Compositor())
+        
+        layers, rgba, compositor = buffers[1:]
+        
+        if stats is None:
+            for row, layer in animated:
+                layer.get_rgba(frame_num % len(layer), layers[row])
+        
+        else:
+            timer = stats.timer
+            layers_start = timer()
+            
+            for row, layer in animated:
+                layer_start = timer()
+                layer.get_rgba(frame_num % len(layer), layers[row])
+                stats.record('layer:' + layer.get_name(),
+                             timer() - layer_start)
+            
+            composite_start = timer()
+            stats.record('layers', composite_start - layers_start)
+        
+        if self.fixed_point:
+            for row, layer in animated:
+                compositor.premultiply(layers[row], layers[row])
+            
+            compositor.composite_premultiplied(layers, rgba)
+        
+        else:
+            compositor.composite(layers, rgba)
+        
+        if stats is not None:
+            stats.record('composite', timer() - composite_start)
+        
+        return rgba
+
+
+    def _get_flattened(self):
+        """
+        Return the layers to combine for each frame, with static runs merged.
+        
+        Returns a tuple (base, animated, rows). base is an Nx8x8x4 uint8
+        array of layers to combine, front-most first, in which the runs of
+        adjacent layers with a single frame chosen by self.flatten_static
+        have been combined into one layer.
+        animated is a list of (row, layer) pairs giving the layers whose
+        values should be placed in each remaining row of base for a frame,
+        and rows is an array of these row numbers. If self.fixed_point is
+        True the combined layers in base are premultiplied.
+        
+        The result is kept until self.layers, self.fixed_point or
+        self.flatten_static changes, or the cache is cleared.
+        """
+        
+        key = (tuple(self.layers), self.fixed_point, self.flatten_static)
+        
+        if self._flattened is not None and key == self._flattened_key:
+            return self._flattened
+        
+        # Group the layers into runs of static layers and single animated
+        # layers, each of which becomes one row. Combining the leading run
+        # ahead of time gives the same values as combining it layer by layer
+        # as it is where combining every frame starts from, but combining a
+        # later run rounds its values differently. In fixed point the
+        # combined values keep 8 bits more than a layer, so no run is exact
+        leading = self.flatten_static == 'leading'
+        flatten = self.flatten_static and not (leading and self.fixed_point)
+        runs = []
+        for layer in self.layers:
+            if len(layer) != 1:
+                runs.append(layer)
+            elif (flatten and runs and type(runs[-1]) == list
+                  and not (leading and len(runs) > 1)):
+                runs[-1].append(layer)
+            else:
+                runs.append([layer])
+        
+        base     = np.zeros((len(runs), 8, 8, 4), dtype=np.uint8)
+        animated = []
+        
+        for row, run in enumerate(runs):
+            if type(run) != list:
+                animated.append((row, run))
+                continue
+            
+            values = np.array([layer.get_rgba(0) for layer in run])
+            
+            if self.fixed_point:
+                base[row] = composite_premultiplied(premultiply(values))
+            else:
+                base[row] = composite(values)
+        
+        rows = np.array([row for row, layer in animated], dtype=np.intp)
+        
+        self._flattened     = (base, animated, rows)
+        self._flattened_key = key
+        
+        return self._flattened
+        
+    
     def add_layer(self, rgb, alpha, name="New Layer"):
         """
         Add a new image layer to the Sense Hat LED matrix.
@@ -107,6 +626,97 @@ class LayerSet(object):
             
         
         self.layers.append(ImageLayer(rgb, alpha, name))
+        self.clear_cache()
+        
+    
+    def append_layer(self, layer):
+        """
+        Add an existing layer object to the Sense Hat LED matrix.
+        
+        Append a layer, such as a CanvasLayer (see the canvas_layer module)
+        or any other ImageLayer object, to the list of layers. The new layer
+        will appear underneath any previously created layers, and effects can
+        be added to it by name in the same way as layers added by add_layer.
+        
+        Inputs:
+        -------
+        layer - The layer to add. Its name should be unique to the list of
+                layers.
+        """
+        
+        if self._get_layer_index(layer.get_name()):
+            raise ValueError("A layer with name '%s' already exists"
+                             % layer.get_name())
+            
+        
+        self.layers.append(layer)
+        self.clear_cache()
+        
+    
+    def add_text_layer(self, text, colour=(255,255,255), name="New Text",
+                       font=None, scroll=True):
+        """
+        Add a new layer of text to the Sense Hat LED matrix.
+        
+        Append a TextLayer (see the text_layer module) to the list of layers.
+        The new layer will appear underneath any previously created layers,
+        and effects can be added to it in the same way as other layers.
+        
+        Inputs:
+        -------
+        text   - The text to show.
+        colour - The (red, green, blue) colour of the text.
+        name   - The name of this layer. The name should be unique to the list
+                 of layers.
+        font   - The GlyphAtlas to draw the text with, or None to use the
+                 built-in 3x5 pixel font.
+        scroll - Set to True to scroll the text across the display from right
+                 to left, or False to show the start of the text still.
+        """
+        
+        self.append_layer(TextLayer(text, colour, name, font, scroll))
+        
+    
+    def set_text(self, layer, text):
+        """
+        Change the text shown by a text layer.
+        
+        Only the characters that differ from the current text are drawn
+        again, and any effects applied to the layer are updated to match the
+        new length of the text.
+        
+        Inputs:
+        -------
+        layer - The text layer to change. You can specify either the name of
+                the layer or its index in self.layers.
+        text  - The new text to show.
+        """
+        
+        if type(layer) == str:
+            idx = self._get_layer_index(layer)
+            
+            # Checked before indexing, as False would select layer 0
+            if idx is False:
+                raise ValueError("No layer named '%s'" % layer)
+        
+        elif type(layer) == int:
+            idx = layer
+            
+        else:
+            raise TypeError("Input 'layer' must be a string or integer")
+        
+        # Find the text layer underneath any effects applied to it
+        text_layer = self.layers[idx]
+        while isinstance(text_layer, AnimatedLayer):
+            text_layer = text_layer.image_layer
+        
+        if not isinstance(text_layer, TextLayer):
+            raise TypeError("Layer '%s' is not a text layer"
+                            % text_layer.get_name())
+        
+        text_layer.set_text(text)
+        self.layers[idx].clear_cache()
+        self.clear_cache()
         
             
     def add_effect_scrolling(self, layer, direction = 'E', padding=0):
@@ -143,6 +753,7 @@ class LayerSet(object):
         
         
         self.layers[idx] = ScrollingLayer(self.layers[idx], direction, padding)
+        self.clear_cache()
 
     
     def add_effect_flashing(self, layer, pattern=[255,0]):
@@ -178,6 +789,56 @@ class LayerSet(object):
             
         
         self.layers[idx] = FlashingLayer(self.layers[idx], pattern)
-
+        self.clear_cache()
+        
+    
+    def compile_effects(self, max_frames=1024):
+        """
+        Precompute every frame of each layer that has effects applied to it.
+        
+        Each layer with effects is replaced by a CompiledLayer (see the
+        image_layer module), which evaluates its chain of effects once over
+        its whole period. Getting the pixels of these layers then no longer
+        depends on the number of effects applied. Effects added afterwards
+        are applied on top of the compiled layer, and can be compiled by
+        calling this method again.
+        
+        Inputs:
+        -------
+        max_frames - Layers that repeat after more than this number of frames
+                     are left as they are, as each frame precomputed uses 256
+                     bytes. None to compile every layer.
+        """
+        
+        for idx, layer in enumerate(self.layers):
+            if (not isinstance(layer, AnimatedLayer) or
+                    isinstance(layer, CompiledLayer)):
+                continue
             
+            if max_frames is None or len(layer) <= max_frames:
+                self.layers[idx] = layer.compile()
+        
+        self.clear_cache()
+    
     
+    def transition_to(self, incoming, num_frames=8, effect='crossfade',
+                      direction='E', start=0):
+        """
+        Create a transition from this image to another.
+        
+        Returns a Transition object (see the transition module), which can be
+        played in the same way as a LayerSet, whose frames change from the
+        frames of this LayerSet to those of incoming.
+        
+        Inputs:
+        -------
+        incoming   - The LayerSet to change to.
+        num_frames - The number of frames the transition takes.
+        effect     - 'crossfade', 'wipe' or 'push'.
+        direction  - The direction of a wipe or push: 'N', 'S', 'E' or 'W'.
+        start      - The frame of this LayerSet to start the transition from,
+                     e.g. the number of frames of it already shown.
+        """
+        
+        return Transition(self, incoming, num_frames, effect, direction,
+                          outgoing_start=start)
@@ -0,0 +1,847 @@
+from __future__ import absolute_import, division
+import math
+import queue
+import signal
+import threading
+import time
+import numpy as np
+
+
+DROP_POLICIES = ('skip', 'catch_up', 'stretch')
+
+# How often, in seconds, a RenderWorker waiting for a frame checks whether it
+# has been closed, and how often play_async checks for a frame
+_POLL_INTERVAL       = 0.05
+_ASYNC_POLL_INTERVAL = 0.002
+
+
+def _asyncio():
+    """
+    Return the asyncio module, which is only imported once it is needed as
+    importing it noticeably slows down importing this package.
+    """
+
+    import asyncio
+    return asyncio
+
+
+class AnimationPlayer(object):
+    """
+    Plays animations on a display backend at a fixed frame rate.
+
+    The player takes the frames of a LayerSet (or any object with the same
+    render and __getitem__ methods, such as an AnimationFile) and writes them
+    to a DisplayBackend at the times given by a FrameScheduler. It does not
+    depend on the Sense Hat, so animations can be played on a VirtualDisplay
+    on any machine.
+
+    To find out how long each stage of displaying a frame takes, assign a
+    RenderStats object (see the profiling module) to self.stats. The same
+    object is used to time the stages of rendering frames of a LayerSet that
+    has no stats object of its own, unless the frames are rendered in a
+    separate process.
+
+    To adjust the brightness, gamma or colour temperature of everything the
+    player shows, assign a ColourLUT object (see the colour_lut module) to
+    self.colour. Its settings can be changed while an animation is playing.
+    This is applied in addition to any ColourLUT of the LayerSet itself.
+
+    Frames that are the same as the last frame written are not written again,
+    and if partial_pixels is set, frames that differ from the last in only a
+    few pixels are written a pixel at a time on displays that support it.
+    The number of frames treated in each way is counted in the writes_skipped
+    and writes_partial attributes of the PlaybackStats returned by play. If
+    something else draws on the display while an animation is playing, call
+    clear_last_frame so that the next frame is written in full.
+
+    Methods:
+    --------
+    play             - Play an animation.
+    play_async       - Play an animation from an asyncio event loop.
+    clear_last_frame - Forget the last frame written to the display.
+    """
+
+    def __init__(self, display, stats=None, skip_unchanged=True,
+                 partial_pixels=0):
+        """
+        Initialise the player.
+
+        Inputs:
+        -------
+        display        - The DisplayBackend to write frames to.
+        stats          - Optional RenderStats object to record timings in.
+        skip_unchanged - If True, frames which are the same as the last frame
+                         written are not written to the display.
+        partial_pixels - The most pixels that can differ from the last frame
+                         for only those pixels to be written, if the display
+                         supports it. 0 always writes whole frames.
+        """
+
+        self.display = display
+        self.stats   = stats
+        self.colour  = None
+
+        self.skip_unchanged = skip_unchanged
+        self.partial_pixels = partial_pixels
+
+        # The last frame written, and buffers for comparing frames with it
+        self._last    = None
+        self._diff    = np.empty((8, 8, 3), dtype=bool)
+        self._changed = np.empty((8, 8), dtype=bool)
+
+
+    def __repr__(self):
+
+        return self.__class__.__name__ + '(' + repr(self.display) + ')'
+
+
+    def clear_last_frame(self):
+        """
+        Forget the last frame written, so that the next frame is written to
+        the display in full. Call this if the display has been changed other
+        than by the player, e.g. cleared or rotated.
+        """
+
+        self._last = None
+
+
+    def play(self, layer_set, fps, total_time=None, num_frames=None,
+             drop_policy='skip', pipeline=None, queue_size=8):
+        """
+        Play an animation on the display.
+
+        Inputs:
+        -------
+        layer_set   - The LayerSet object to play.
+        fps         - The speed of the animation in frames per second.
+        total_time  - The total time to play the animation, in seconds.
+        num_frames  - The number of frames to play. Used instead of
+                      total_time if given. If neither is given the animation
+                      plays until interrupted.
+        drop_policy - What to do if drawing frames falls behind. One of
+                      'skip', 'catch_up' or 'stretch'. See FrameScheduler.
+        pipeline    - None to render each frame just before it is shown,
+                      'thread' to render frames in a background thread, or
+                      'process' to render them in a separate process.
+        queue_size  - The maximum number of frames to render in advance
+                      when using a pipeline.
+
+        Returns a PlaybackStats object with the achieved frame rate, jitter
+        and number of dropped frames.
+        """
+
+        scheduler = self._create_scheduler(fps, total_time, num_frames,
+                                           drop_policy)
+
+        self.clear_last_frame()
+
+        with _SharedStats(layer_set, self.stats):
+            if pipeline is None:
+                render = self._renderer(layer_set)
+
+                for frame_num in scheduler:
+
+                    self._show(render, frame_num, scheduler.stats)
+
+            else:
+                worker = self._create_worker(layer_set, scheduler, pipeline,
+                                             queue_size)
+
+                with worker:
+                    for frame_num in scheduler:
+
+                        self._show(worker.get, frame_num, scheduler.stats)
+
+        return scheduler.stats
+
+
+    async def play_async(self, layer_set, fps, total_time=None,
+                         num_frames=None, drop_policy='skip',
+                         pipeline='thread', queue_size=8):
+        """
+        Play an animation on the display from an asyncio event loop.
+
+        A coroutine version of play, which waits between frames using asyncio
+        so that other tasks can run alongside the animation. Frames are
+        rendered in the background by a thread or process, so rendering does
+        not block the event loop. The inputs are the same as for play, except
+        that pipeline must be either 'thread' or 'process'.
+
+        Returns a PlaybackStats object with the achieved frame rate, jitter
+        and number of dropped frames.
+        """
+
+        scheduler = self._create_scheduler(fps, total_time, num_frames,
+                                           drop_policy)
+
+        worker = self._create_worker(layer_set, scheduler, pipeline,
+                                     queue_size)
+
+        self.clear_last_frame()
+
+        with _SharedStats(layer_set, self.stats), worker:
+            async for frame_num in scheduler:
+
+                stats = self.stats
+                start = stats.timer() if stats is not None else None
+
+                # Wait for the frame without blocking the event loop, checking
+                # the worker between short sleeps so that cancelling the task
+                # is never held up by a thread waiting on the queue
+                while True:
+                    try:
+                        values = worker.get(frame_num, timeout=0)
+                        break
+                    except queue.Empty:
+                        await _asyncio().sleep(_ASYNC_POLL_INTERVAL)
+
+                self._write(values, scheduler.stats, start)
+
+        return scheduler.stats
+
+
+    def _create_scheduler(self, fps, total_time, num_frames, drop_policy):
+
+        if num_frames is None and total_time is not None:
+            num_frames = int(total_time*fps)
+
+        return FrameScheduler(fps, num_frames, drop_policy)
+
+
+    def _create_worker(self, layer_set, scheduler, pipeline, queue_size):
+
+        if pipeline not in ('thread', 'process'):
+            raise ValueError("pipeline should be None, 'thread' or 'process'")
+
+        return RenderWorker(layer_set, scheduler.num_frames, queue_size,
+                            use_process = pipeline == 'process',
+                            as_array = self._uses_arrays())
+
+
+    def _renderer(self, layer_set):
+        """
+        Return the method of layer_set that renders frames in the form used
+        by the display.
+        """
+
+        if not self._uses_arrays():
+            return layer_set.__getitem__
+
+        render_into = getattr(layer_set, 'render_into', None)
+        if render_into is None:
+            return layer_set.render
+
+        # Render every frame into the same array, so that no new arrays are
+        # created for each frame
+        frame = np.empty((8, 8, 3), dtype=np.uint8)
+
+        return lambda frame_num: render_into(frame_num, frame)
+
+
+    def _uses_arrays(self):
+        """
+        Return True if frames should be rendered as arrays rather than lists.
+        """
+
+        # Colour correction and comparing frames are carried out on arrays
+        return (not self.display.uses_lists or self.colour is not None or
+                self.skip_unchanged or self.partial_pixels > 0)
+
+
+    def _show(self, render, frame_num, playback):
+        """
+        Show frame frame_num, as returned by render(frame_num).
+        """
+
+        stats = self.stats
+
+        if stats is None:
+            self._write(render(frame_num), playback)
+
+        else:
+            start = stats.timer()
+            self._write(render(frame_num), playback, start)
+
+
+    def _write(self, values, playback, start=None):
+        """
+        Colour correct rendered values and write them to the display, unless
+        they are the same as the last frame written, counting skipped and
+        partial writes in the PlaybackStats playback. If start is given, the
+        time taken to write the frame, and for the whole frame since start,
+        are recorded in self.stats.
+        """
+
+        display = self.display
+        colour  = self.colour
+        stats   = self.stats
+
+        if colour is not None:
+            values = colour.apply(values)
+
+        changed = None
+
+        if isinstance(values, np.ndarray) and (self.skip_unchanged or
+                                               self.partial_pixels > 0):
+            values = values.reshape(8,8,3)
+            last   = self._last
+
+            if last is None:
+                last = self._last = np.empty((8, 8, 3), dtype=np.uint8)
+
+            else:
+                np.not_equal(values, last, out=self._diff)
+                changed = np.any(self._diff, axis=2, out=self._changed)
+                num_changed = np.count_nonzero(changed)
+
+                if num_changed == 0 and self.skip_unchanged:
+                    playback.writes_skipped += 1
+
+                    if start is not None:
+                        stats.record('frame', stats.timer() - start)
+
+                    return
+
+                if not (display.supports_partial and
+                        0 < num_changed <= self.partial_pixels):
+                    changed = None
+
+            np.copyto(last, values)
+
+        if start is not None:
+            write_start = stats.timer()
+
+        if changed is not None:
+            display.write_changed(values, changed)
+            playback.writes_partial += 1
+
+        elif display.uses_lists and isinstance(values, np.ndarray):
+            display.write(values.reshape(64,3).tolist())
+
+        else:
+            display.write(values)
+
+        if start is not None:
+            end = stats.timer()
+
+            stats.record('write', end - write_start)
+            stats.record('frame', end - start)
+
+
+class _SharedStats(object):
+    """
+    Context manager that lends a RenderStats object to a LayerSet that has
+    none of its own, for the duration of the context.
+    """
+
+    def __init__(self, layer_set, stats):
+
+        self.layer_set = layer_set
+        self.lent = (stats is not None and
+                     getattr(layer_set, 'stats', False) is None)
+
+        if self.lent:
+            layer_set.stats = stats
+
+
+    def __enter__(self):
+
+        return self
+
+
+    def __exit__(self, *exc_info):
+
+        if self.lent:
+            self.layer_set.stats = None
+
+
+class PlaybackStats(object):
+    """
+    Statistics recorded while playing an animation.
+
+    The lateness of each frame is the time between the moment the frame was
+    due to be shown and the moment it had been rendered and written to the
+    display, so it includes the time taken to render and write the frame as
+    well as any delay in starting it. Only running totals are kept, so the
+    memory used does not grow with the length of the animation.
+
+    Attributes:
+    -----------
+    frames_shown   - The number of frames that were displayed.
+    frames_dropped - The number of frames skipped to keep up with the clock.
+    elapsed        - The total time taken to play the animation, in seconds.
+    max_lateness   - The latest that any frame was shown, in seconds.
+    writes_skipped - The number of frames not written to the display as they
+                     were the same as the last frame written.
+    writes_partial - The number of frames for which only the pixels that
+                     changed were written to the display.
+
+    Methods:
+    --------
+    achieved_fps  - Return the average number of frames shown per second.
+    mean_lateness - Return the average lateness of the frames, in seconds.
+    jitter        - Return the standard deviation of the lateness, in seconds.
+    """
+
+    def __init__(self):
+
+        self.frames_shown   = 0
+        self.frames_dropped = 0
+        self.elapsed        = 0.0
+        self.max_lateness   = 0.0
+        self.writes_skipped = 0
+        self.writes_partial = 0
+
+        # Running mean and sum of squared differences of the lateness
+        self._mean = 0.0
+        self._m2   = 0.0
+
+
+    def __repr__(self):
+
+        return ('%s(frames_shown=%d, frames_dropped=%d, writes_skipped=%d, '
+                'writes_partial=%d, fps=%.2f, jitter=%.4f)'
+                % (self.__class__.__name__, self.frames_shown,
+                   self.frames_dropped, self.writes_skipped,
+                   self.writes_partial, self.achieved_fps(), self.jitter()))
+
+
+    def record(self, lateness):
+        """
+        Record that a frame was shown lateness seconds after its deadline.
+        """
+
+        self.frames_shown += 1
+
+        delta = lateness - self._mean
+        self._mean += delta / self.frames_shown
+        self._m2   += delta * (lateness - self._mean)
+
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+
+    def achieved_fps(self):
+        """
+        Return the average number of frames shown per second.
+        """
+
+        if self.elapsed <= 0:
+            return 0.0
+
+        return self.frames_shown / self.elapsed
+
+
+    def mean_lateness(self):
+        """
+        Return the average time in seconds that frames were shown late.
+        """
+
+        return self._mean
+
+
+    def jitter(self):
+        """
+        Return the standard deviation of the lateness of the frames.
+        """
+
+        if self.frames_shown < 2:
+            return 0.0
+
+        return math.sqrt(self._m2 / (self.frames_shown - 1))
+
+
+class FrameScheduler(object):
+    """
+    Iterator that produces frame numbers at a fixed rate.
+
+    Frame n is due at a fixed time n/fps seconds after the start, measured
+    with a monotonic clock. Iterating over the scheduler waits until each
+    frame's deadline before producing its number, so the time spent rendering
+    and displaying a frame does not add to the time between frames and the
+    animation does not drift. When rendering falls behind, the drop policy
+    decides what happens:
+
+    'skip'     - Skip ahead to the latest frame that is due, so the animation
+                 stays in time with the clock. Skipped frames are counted in
+                 stats.frames_dropped.
+    'catch_up' - Show every frame, without waiting, until the animation is
+                 back in time with the clock.
+    'stretch'  - Show every frame, and delay all the following deadlines so
+                 that the animation runs slower rather than skipping.
+
+    Once the final frame has been produced the scheduler waits until the end
+    of its time slot, so that playback lasts num_frames/fps seconds.
+
+    Each frame is recorded in stats once the loop has finished with it and
+    asks for the next frame, so its lateness is measured after the frame has
+    been rendered and shown.
+    """
+
+    def __init__(self, fps, num_frames=None, drop_policy='skip', clock=None,
+                 sleep=None):
+        """
+        Initialise the scheduler with a frame rate.
+
+        Inputs:
+        -------
+        fps         - The number of frames to show per second.
+        num_frames  - The number of frames to produce, or None to continue
+                      indefinitely.
+        drop_policy - What to do when frames are late. One of 'skip',
+                      'catch_up' or 'stretch'.
+        clock       - Function returning the current time in seconds. Defaults
+                      to time.monotonic.
+        sleep       - Function used to wait for a number of seconds. Defaults
+                      to time.sleep.
+        """
+
+        if fps <= 0:
+            raise ValueError("fps should be greater than 0")
+
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError("drop_policy should be one of %s"
+                             % ", ".join(DROP_POLICIES))
+
+        self.fps         = fps
+        self.num_frames  = num_frames
+        self.drop_policy = drop_policy
+
+        self.clock = clock if clock is not None else time.monotonic
+        self.sleep = sleep if sleep is not None else time.sleep
+
+        self.stats = PlaybackStats()
+
+
+    def __iter__(self):
+
+        frame_num = self._start()
+
+        try:
+            while not self._finished(frame_num):
+
+                delay = self._delay(frame_num)
+                if delay > 0:
+                    self.sleep(delay)
+
+                yield frame_num
+
+                # The frame has now been rendered and written by the loop
+                self._record(frame_num)
+
+                frame_num = self._next_frame(frame_num)
+
+            # Leave the final frame on display for its full time slot
+            delay = self._delay(frame_num)
+            if delay > 0:
+                self.sleep(delay)
+
+        finally:
+            self._stop()
+
+
+    async def __aiter__(self):
+        """
+        Produce frame numbers asynchronously, waiting using asyncio.sleep.
+
+        This allows the scheduler to be used with 'async for' inside an
+        asyncio event loop, without blocking other tasks while waiting.
+        """
+
+        frame_num = self._start()
+
+        try:
+            while not self._finished(frame_num):
+
+                delay = self._delay(frame_num)
+                if delay > 0:
+                    await _asyncio().sleep(delay)
+
+                yield frame_num
+
+                self._record(frame_num)
+
+                frame_num = self._next_frame(frame_num)
+
+            delay = self._delay(frame_num)
+            if delay > 0:
+                await _asyncio().sleep(delay)
+
+        finally:
+            self._stop()
+
+
+    def _start(self):
+        """
+        Reset the statistics and the start time, returning the first frame.
+        """
+
+        self.stats = PlaybackStats()
+        self._start_time = self._base = self.clock()
+
+        return 0
+
+
+    def _stop(self):
+
+        self.stats.elapsed = self.clock() - self._start_time
+
+
+    def _finished(self, frame_num):
+
+        return self.num_frames is not None and frame_num >= self.num_frames
+
+
+    def _delay(self, frame_num):
+        """
+        Return the time in seconds until frame frame_num is due.
+        """
+
+        return self._base + frame_num / self.fps - self.clock()
+
+
+    def _record(self, frame_num):
+
+        self.stats.record(-self._delay(frame_num))
+
+
+    def _next_frame(self, frame_num):
+        """
+        Return the next frame to show after frame frame_num has been shown.
+        """
+
+        next_frame = frame_num + 1
+        now = self.clock()
+
+        if self.drop_policy == 'skip':
+            # The latest frame whose deadline has already passed
+            due = int((now - self._base) * self.fps)
+            if self.num_frames is not None:
+                due = min(due, self.num_frames)
+
+            if due > next_frame:
+                self.stats.frames_dropped += due - next_frame
+                next_frame = due
+
+        elif self.drop_policy == 'stretch':
+            if self._base + next_frame / self.fps < now:
+                self._base = now - next_frame / self.fps
+
+        return next_frame
+
+
+class RenderWorker(object):
+    """
+    Renders the frames of a LayerSet in the background, ahead of time.
+
+    The worker runs in a separate thread, or a separate process for scenes
+    that are expensive to render, and places rendered frames into a queue of
+    limited size. Once the queue is full the worker waits for frames to be
+    taken from it, so it never gets more than queue_size frames ahead. Frames
+    are rendered in order, but if frames are requested out of order (e.g. a
+    scheduler skipping frames) the worker jumps ahead to the requested frame.
+
+    Methods:
+    --------
+    start - Start rendering frames.
+    get   - Return the rendered values for a frame.
+    close - Stop rendering and wait for the worker to finish.
+    """
+
+    def __init__(self, layer_set, num_frames=None, queue_size=8,
+                 use_process=False, as_array=False):
+        """
+        Initialise the worker.
+
+        Inputs:
+        -------
+        layer_set   - The LayerSet object to render.
+        num_frames  - The number of frames to render, or None to continue
+                      until the worker is closed.
+        queue_size  - The maximum number of frames to render in advance.
+        use_process - Set to True to render in a separate process rather than
+                      a thread. The LayerSet is copied to the new process.
+        as_array    - Set to True to render frames as 8x8x3 arrays (see
+                      LayerSet.render) rather than as lists of rgb values.
+        """
+
+        if queue_size < 1:
+            raise ValueError("queue_size should be at least 1")
+
+        import multiprocessing
+
+        self.layer_set   = layer_set
+        self.num_frames  = num_frames
+        self.queue_size  = queue_size
+        self.use_process = use_process
+        self.as_array    = as_array
+
+        if use_process:
+            self._queue  = multiprocessing.Queue(queue_size)
+            self._stop   = multiprocessing.Event()
+        else:
+            self._queue  = queue.Queue(queue_size)
+            self._stop   = threading.Event()
+
+        # The frame most recently requested, shared with the worker
+        self._wanted = multiprocessing.Value('l', 0, lock=False)
+        self._worker = None
+
+
+    def __enter__(self):
+
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+    def start(self):
+        """
+        Start rendering frames in the background.
+        """
+
+        args = (self.layer_set, self.num_frames, self.as_array, self._queue,
+                self._stop, self._wanted)
+
+        if self.use_process:
+            import multiprocessing
+            self._worker = multiprocessing.Process(target=_render_process,
+                                                   args=args)
+        else:
+            self._worker = threading.Thread(target=_render_worker, args=args)
+
+        self._worker.daemon = True
+        self._worker.start()
+
+
+    def get(self, frame_num, timeout=None):
+        """
+        Return the rendered values for frame frame_num.
+
+        Frames rendered before frame_num are discarded. Waits for the frame to
+        be rendered if it is not yet available, raising queue.Empty if it is
+        not available within timeout seconds (None to wait indefinitely) and
+        IndexError if the worker has already finished or has been closed.
+        """
+
+        self._wanted.value = frame_num
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            if self._stop.is_set():
+                raise IndexError("The worker has been closed")
+
+            # Wait in short steps so that closing the worker is noticed
+            if deadline is None:
+                wait = _POLL_INTERVAL
+            else:
+                wait = min(_POLL_INTERVAL, max(deadline - time.monotonic(), 0))
+
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+                continue
+
+            if item is None:
+                raise IndexError("No more frames to render")
+
+            if isinstance(item, BaseException):
+                raise item
+
+            if item[0] >= frame_num:
+                return item[1]
+
+
+    def close(self):
+        """
+        Stop rendering and wait for the worker to finish.
+        """
+
+        if self._worker is None:
+            return
+
+        self._stop.set()
+
+        # Empty the queue so that a worker waiting to add a frame can stop
+        while self._worker.is_alive():
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            self._worker.join(0.05)
+
+        self._worker = None
+
+
+def _render_process(*args):
+    """
+    Run _render_worker in the worker process of a RenderWorker.
+
+    Ctrl-C is sent to every process in the foreground, so it is ignored here
+    and the worker is left to be stopped by the parent closing the
+    RenderWorker, rather than printing a traceback from the child.
+    """
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    _render_worker(*args)
+
+
+def _render_worker(layer_set, num_frames, as_array, out_queue, stop, wanted):
+    """
+    Render frames into out_queue until stopped or num_frames are rendered.
+
+    Runs in the worker thread or process of a RenderWorker. Exceptions are
+    passed through the queue to be raised by RenderWorker.get.
+    """
+
+    frame_num = 0
+
+    try:
+        while True:
+
+            frame_num = max(frame_num, wanted.value)
+
+            if num_frames is not None and frame_num >= num_frames:
+                break
+
+            if as_array:
+                values = layer_set.render(frame_num)
+            else:
+                values = layer_set[frame_num]
+
+            if not _put(out_queue, (frame_num, values), stop):
+                return
+
+            frame_num += 1
+
+        _put(out_queue, None, stop)
+
+    except Exception as error:
+        _put(out_queue, error, stop)
+
+
+def _put(out_queue, item, stop):
+    """
+    Add item to out_queue, waiting for space unless stop is set.
+
+    Returns True if the item was added, or False if stop was set first.
+    """
+
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.05)
+            return True
+        except queue.Full:
+            pass
+
+    return False
@@ -0,0 +1,231 @@
+from __future__ import absolute_import, division
+import math
+import threading
+import time
+
+
+# Histogram buckets are spaced logarithmically, with BUCKETS_PER_DECADE
+# buckets for every factor of 10, from MIN_TIME up to MIN_TIME * 10**DECADES
+# seconds. Times outside this range are counted in the first or last bucket.
+MIN_TIME           = 1e-7
+DECADES            = 8
+BUCKETS_PER_DECADE = 10
+
+
+class StageStats(object):
+    """
+    Timing statistics for one stage of rendering or displaying frames.
+
+    Keeps the number of times the stage was timed, the total, smallest and
+    largest times, and a histogram of the times from which percentiles can be
+    estimated. The memory used does not grow with the number of timings.
+
+    Methods:
+    --------
+    record     - Record the time taken by the stage.
+    mean       - Return the average time taken by the stage.
+    percentile - Return an estimate of a percentile of the times taken.
+    histogram  - Return the upper bound and count of each histogram bucket.
+    """
+
+    def __init__(self):
+
+        self.count = 0
+        self.total = 0.0
+        self.min   = None
+        self.max   = None
+
+        self._buckets = [0] * (DECADES * BUCKETS_PER_DECADE + 1)
+
+
+    def __repr__(self):
+
+        return ('%s(count=%d, mean=%.6f, p50=%.6f, p99=%.6f, max=%.6f)'
+                % (self.__class__.__name__, self.count, self.mean(),
+                   self.percentile(50), self.percentile(99), self.max or 0))
+
+
+    def record(self, seconds):
+        """
+        Record that the stage took the given number of seconds.
+        """
+
+        self.count += 1
+        self.total += seconds
+
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+        if seconds <= MIN_TIME:
+            idx = 0
+        else:
+            idx = int(math.log10(seconds / MIN_TIME) * BUCKETS_PER_DECADE) + 1
+            idx = min(idx, len(self._buckets) - 1)
+
+        self._buckets[idx] += 1
+
+
+    def mean(self):
+        """
+        Return the average time in seconds taken by the stage.
+        """
+
+        if self.count == 0:
+            return 0.0
+
+        return self.total / self.count
+
+
+    def percentile(self, percent):
+        """
+        Return an estimate of the given percentile (0-100) of the times.
+
+        The estimate is the upper bound of the histogram bucket containing
+        the percentile, and is within about 25% of the true value.
+        """
+
+        if self.count == 0:
+            return 0.0
+
+        target = percent / 100 * self.count
+        seen = 0
+
+        for upper, count in self.histogram():
+            seen += count
+            if count and seen >= target:
+                return min(upper, self.max)
+
+        return self.max
+
+
+    def histogram(self):
+        """
+        Return a list of (upper bound in seconds, count) for each bucket.
+        """
+
+        return [(MIN_TIME * 10 ** (idx / BUCKETS_PER_DECADE), count)
+                for idx, count in enumerate(self._buckets)]
+
+
+class RenderStats(object):
+    """
+    Collects timing statistics for the stages of rendering and displaying.
+
+    Assign a RenderStats object to the stats attribute of a LayerSet or an
+    AnimationPlayer (or use the SenseImage class' set_profiling method) to
+    time the following stages of each frame:
+
+    'layer:<name>' - Getting the pixels of the layer with the given name.
+    'layers'       - Getting the pixels of all layers.
+    'composite'    - Combining the layers together.
+    'convert'      - Converting the combined image to an array and list.
+    'render'       - Producing the frame, including looking up the cache.
+    'write'        - Writing the frame to the display.
+    'frame'        - Rendering and writing the frame.
+
+    When no RenderStats object is assigned no timings are made, so the only
+    cost is checking whether the stats attribute is None. Timings can be
+    recorded from several threads at once, e.g. by a LayerSet rendered in a
+    RenderWorker thread while an AnimationPlayer times writing to the display.
+
+    Methods:
+    --------
+    record  - Record the time taken by a stage.
+    timer   - Return the current time, for timing stages.
+    stage   - Return the StageStats for a stage.
+    summary - Return a dictionary of the main statistics of each stage.
+    reset   - Remove all statistics.
+    """
+
+    def __init__(self, callback=None):
+        """
+        Initialise the statistics.
+
+        Inputs:
+        -------
+        callback - Optional function, called as callback(stage, seconds)
+                   each time a stage is timed.
+        """
+
+        self.callback = callback
+        self.stages = {}
+
+        self._lock = threading.Lock()
+
+
+    def __getstate__(self):
+
+        # Locks cannot be copied to another process
+        state = self.__dict__.copy()
+        del state['_lock']
+
+        return state
+
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join(sorted(self.stages)))
+
+
+    timer = staticmethod(time.perf_counter)
+
+
+    def record(self, stage, seconds):
+        """
+        Record that the named stage took the given number of seconds.
+        """
+
+        with self._lock:
+            stats = self.stages.get(stage)
+
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+
+            stats.record(seconds)
+
+        if self.callback is not None:
+            self.callback(stage, seconds)
+
+
+    def stage(self, stage):
+        """
+        Return the StageStats object for the named stage.
+        """
+
+        return self.stages[stage]
+
+
+    def summary(self):
+        """
+        Return a dictionary of the count, mean, percentiles and maximum time
+        taken by each stage, in seconds.
+        """
+
+        with self._lock:
+            return dict(
+                (name, {'count' : stats.count,
+                        'mean'  : stats.mean(),
+                        'p50'   : stats.percentile(50),
+                        'p90'   : stats.percentile(90),
+                        'p99'   : stats.percentile(99),
+                        'max'   : stats.max})
+                for name, stats in self.stages.items())
+
+
+    def reset(self):
+        """
+        Remove all statistics.
+        """
+
+        with self._lock:
+            self.stages = {}
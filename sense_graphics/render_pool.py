@@ -0,0 +1,193 @@
+from __future__ import absolute_import, division
+import os
+import numpy as np
+
+
+class RenderPool(object):
+    """
+    Renders the frames of LayerSets using a pool of worker processes.
+
+    Rendering in one process is limited to a single core, so a controller
+    driving many displays, or pre-rendering a long animation, can use a
+    RenderPool to spread the work across every core. The frames rendered by
+    the workers are written directly into a shared memory buffer rather than
+    being pickled and sent back, and are always returned in the order they
+    were requested, however the work was divided between the workers. Each
+    call sends copies of the LayerSets to the workers, without their cached
+    frames.
+
+    Methods:
+    --------
+    render_frames - Render a range of frames of one LayerSet.
+    render_many   - Render the same range of frames of several LayerSets.
+    render        - Render one frame of each of several LayerSets.
+    close         - Stop the worker processes.
+    """
+
+    def __init__(self, workers=None, context=None):
+        """
+        Initialise the pool and start its worker processes.
+
+        Inputs:
+        -------
+        workers - The number of worker processes, or None for one for each
+                  CPU core.
+        context - The multiprocessing start method to use, e.g. 'fork',
+                  'spawn' or 'forkserver', or None for the default.
+        """
+
+        import multiprocessing
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers < 1:
+            raise ValueError("workers should be at least 1")
+
+        # Start the tracker of shared memory blocks before the workers, so
+        # that they share it rather than each starting their own, which would
+        # remove blocks still in use when the workers exit
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()
+
+        self.workers = workers
+        self._pool   = multiprocessing.get_context(context).Pool(workers)
+
+
+    def __repr__(self):
+
+        return '%s(workers=%d)' % (self.__class__.__name__, self.workers)
+
+
+    def __enter__(self):
+
+        return self
+
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+    def close(self):
+        """
+        Stop the worker processes and wait for them to exit.
+        """
+
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+    def render_frames(self, layer_set, start, stop, step=1):
+        """
+        Render a range of frames of a LayerSet, split between the workers.
+
+        Returns the same Fx8x8x3 uint8 array as layer_set.render_frames(start,
+        stop, step). The frames are divided into one contiguous range for
+        each worker. Frames beyond the period of the animation repeat earlier
+        frames, so each frame within the period is only rendered once.
+        """
+
+        frame_nums = np.arange(start, stop, step)
+        period     = len(layer_set)
+
+        if len(frame_nums) > period:
+            frames = self.render_frames(layer_set, 0, period)
+            return frames[frame_nums % period]
+
+        tasks = []
+        bounds = np.linspace(0, len(frame_nums), self.workers + 1).astype(int)
+
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            if first < last:
+                tasks.append((slice(first, last), layer_set,
+                              start + first * step, start + last * step, step))
+
+        return self._run((len(frame_nums), 8, 8, 3), tasks)
+
+
+    def render_many(self, layer_sets, start, stop, step=1):
+        """
+        Render the same range of frames of each of several LayerSets.
+
+        Returns an LxFx8x8x3 uint8 array, where L is the number of LayerSets
+        and F the number of frames, so that result[idx] holds the frames of
+        layer_sets[idx] as returned by its render_frames method. The
+        LayerSets are divided between the workers.
+        """
+
+        num_frames = len(range(start, stop, step))
+
+        tasks = [(idx, layer_set, start, stop, step)
+                 for idx, layer_set in enumerate(layer_sets)]
+
+        return self._run((len(tasks), num_frames, 8, 8, 3), tasks)
+
+
+    def render(self, layer_sets, frame_num):
+        """
+        Render frame frame_num of each of several LayerSets.
+
+        Returns an Lx8x8x3 uint8 array holding the frame of each LayerSet, in
+        the same order as layer_sets, e.g. to show on a group of displays.
+        """
+
+        return self.render_many(layer_sets, frame_num, frame_num + 1)[:,0]
+
+
+    def _run(self, shape, tasks):
+        """
+        Carry out the tasks in the workers, returning the frames they render.
+
+        Each task is a tuple (index, layer_set, start, stop, step), and the
+        frames it renders are written to result[index] of an array of the
+        given shape, held in shared memory while the tasks run.
+        """
+
+        from multiprocessing import shared_memory
+
+        if self._pool is None:
+            raise ValueError("The RenderPool has been closed")
+
+        size = int(np.prod(shape))
+        shm  = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+        try:
+            # Divide the tasks evenly between the workers, keeping each
+            # worker's tasks together so that fewer messages are sent
+            chunks = [tasks[idx::self.workers] for idx in range(self.workers)]
+
+            self._pool.starmap(_render_tasks, [(shm.name, shape, chunk)
+                                               for chunk in chunks if chunk])
+
+            frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).copy()
+
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return frames
+
+
+def _render_tasks(name, shape, tasks):
+    """
+    Render the frames of each task into the shared memory block name.
+
+    Runs in a worker process of a RenderPool.
+    """
+
+    from multiprocessing import shared_memory
+
+    shm    = shared_memory.SharedMemory(name=name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    try:
+        for index, layer_set, start, stop, step in tasks:
+            frames[index] = layer_set.render_frames(start, stop, step)
+
+    finally:
+        # Release the view before closing the shared memory
+        del frames
+        shm.close()
@@ -1,9 +1,17 @@
+from collections import OrderedDict
 from sense_hat import SenseHat
+from .streaming import WindowAggregator, SlidingRange
+import numpy as np
 import time
 import random
 
 bar_colour = [255,0,0]
 
+SERIES_STYLES = ('bar', 'line')
+
+# Height of each row of the LED matrix above the bottom row, top row first
+_row_heights = np.arange(7, -1, -1).reshape(8, 1)
+
 class SenseGraph(SenseHat):
     """
     Extension of the Sense Hat class, with basic plotting capability.
@@ -14,11 +22,47 @@ class SenseGraph(SenseHat):
     SenseGraph builds on this functionality by having the ability to display
     a simple bar graph on the LED matrix.
     
+    The values of the 8 most recent bars are kept in a ring buffer, and the
+    graph is drawn from these values each time it changes, so the LED matrix
+    never has to be read back. The graph starts off with 8 empty bars.
+    
+    Several named series of raw values, such as CPU use, memory use and
+    temperature, can also be plotted on the same graph, each in its own
+    colour (see add_series and add_values). Each series is scaled to fit the
+    graph using the smallest and largest of its recent values, and where
+    series overlap the brightest red, green and blue of their colours are
+    shown, so that every series remains visible.
+    
     Methods:
     --------
-    add_bar   - Add an extra bar to the graph on the SenseHat.
+    add_bar       - Add an extra bar to the graph on the SenseHat.
+    add_bars      - Add several bars to the graph at once.
+    add_range     - Add an extra bar covering a range of values.
+    clear_bars    - Remove all bars from the graph.
+    stream        - Plot samples from a high-rate source of values.
+    add_series    - Add a named series of values to plot.
+    remove_series - Stop plotting a series.
+    add_values    - Add the next value of each series to the graph.
     """
 
+    def __init__(self, *args, **kwargs):
+
+        SenseHat.__init__(self, *args, **kwargs)
+
+        self.bar_colour = list(bar_colour)
+
+        # Ring buffer of bar values, with the oldest value at self._oldest.
+        # Bars run from the value in self._lows up to that in self._values
+        self._values = np.zeros(8)
+        self._lows   = np.zeros(8)
+        self._oldest = 0
+
+        # Named series, in the order they were added, and the position of
+        # the oldest value in each of their ring buffers
+        self._series = OrderedDict()
+        self._series_oldest = 0
+
+
     def add_bar(self,value):
         """
         Add a new bar to the graph displayed on the LED matrix.
@@ -34,40 +78,375 @@ class SenseGraph(SenseHat):
                 the bar will reflect the inputted value.
         """
 
-        empty = [0,0,0]
+        self._push(value)
+        self._draw()
+
+
+    def add_bars(self, values):
+        """
+        Add a sequence of new bars to the graph displayed on the LED matrix.
+        
+        Has the same result as calling add_bar for each value in turn, but the
+        LED matrix is only updated once, after all of the values are added.
+        
+        Inputs:
+        -------
+        values - Sequence of values between 0 and 1, oldest first.
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        num_values = len(values)
+
+        if num_values == 0:
+            return
+
+        # Only the 8 most recent values remain on the graph
+        recent = values[-8:]
+        first  = self._oldest + num_values - len(recent)
+        idx    = (first + np.arange(len(recent))) % 8
+
+        self._values[idx] = recent
+        self._lows[idx]   = 0
+        self._oldest = (self._oldest + num_values) % 8
+
+        self._draw()
+
+
+    def add_range(self, low, high):
+        """
+        Add a new bar to the graph covering the range of values low to high.
+        
+        Works in the same way as add_bar, but the bar starts at the value low
+        rather than at the bottom of the graph. This can be used to show the
+        smallest and largest values of a sample, for example.
+        
+        Inputs:
+        -------
+        low  - Value for the bottom of the bar, between 0 and 1.
+        high - Value for the top of the bar, between 0 and 1.
+        """
+
+        self._push(high, low)
+        self._draw()
+
+
+    def clear_bars(self):
+        """
+        Remove all bars from the graph and clear the LED matrix.
+        """
+
+        self._values[:] = 0
+        self._lows[:]   = 0
+        self._oldest = 0
+
+        for series in self._series.values():
+            series.clear()
+
+        self._series_oldest = 0
+
+        self._draw()
+
+
+    def stream(self, source, count=None, duration=None, aggregate='mean',
+               max_fps=None, sample_interval=None, total_time=None):
+        """
+        Plot the samples from a source of values that updates at a high rate.
+        
+        Samples are combined into windows of a fixed number of samples or a
+        fixed length of time (see WindowAggregator), and one bar is added to
+        the graph per window. The LED matrix is updated at most max_fps times
+        per second, however quickly the windows are completed, so the rate at
+        which samples are taken is independent of the rate of updating the
+        display. Returns once the source runs out of samples or total_time has
+        passed.
+        
+        Inputs:
+        -------
+        source          - An iterable (e.g. a generator) of sample values, or
+                          a function that returns a new sample value each time
+                          it is called. Values should be between 0 and 1.
+        count           - The number of samples in each bar.
+        duration        - The length of time in seconds covered by each bar.
+                          Exactly one of count and duration should be given.
+        aggregate       - How to combine the samples for each bar. One of
+                          'mean', 'max', 'min', 'last', or 'envelope' to draw
+                          each bar from the smallest to the largest sample.
+        max_fps         - The maximum number of times per second to update
+                          the LED matrix, or None to update it for every bar.
+        sample_interval - The time in seconds to wait between calls when the
+                          source is a function, or None to not wait.
+        total_time      - The maximum time in seconds to plot samples for, or
+                          None to continue until the source runs out.
+        """
+
+        aggregator = WindowAggregator(aggregate, count, duration)
+
+        if callable(source):
+            samples = _call_repeatedly(source, sample_interval)
+        else:
+            samples = iter(source)
+
+        min_interval = 0 if max_fps is None else 1 / max_fps
+        start = last_draw = time.monotonic()
+        pending = False
+
+        for value in samples:
+
+            now = time.monotonic()
+            if total_time is not None and now - start >= total_time:
+                break
+
+            result = aggregator.add(value, now)
 
-        pixels = self.get_pixels()
+            if result is not None:
+                self._push_result(result)
+                pending = True
 
-        # Rotate the list of elements around by 1
-        pixels.append(pixels.pop(0))
+            if pending and now - last_draw >= min_interval:
+                self._draw()
+                last_draw = now
+                pending = False
 
-        # Work out what values to set each new pixel to
-        column = []
-        value *= 8
+        # Add the incomplete final window, and show any bars not yet shown
+        result = aggregator.flush()
+
+        if result is not None:
+            self._push_result(result)
+            pending = True
+
+        if pending:
+            self._draw()
+
+
+    def add_series(self, name, colour, style='bar', low=None, high=None,
+                   horizon=8):
+        """
+        Add a named series of values to plot on the graph.
         
-        # Set the values used for each pixel of the bar
-        while len(column) < 8:
-            if value >= 1:
-                pixel = bar_colour
-                value -= 1
-                
-            elif value > 0:
-                pixel = [round(channel * value) for channel in bar_colour]
-                value = 0
-                
-            else:
-                pixel = empty
-
-            column.insert(0,pixel)
-
-            
-        # Replace the last column of the sense hat pixels with the new values
-        new_pixel = 0
-        for i in range(7, 64, 8):
-            pixels[i] = column[new_pixel]
-            new_pixel += 1
-
-        self.set_pixels(pixels)
+        Values are added to every series at once using add_values, and each
+        is given its own column, the newest on the right-hand side. Unless
+        fixed limits are given, the values are scaled so that the smallest
+        value within the horizon is at the bottom of the graph and the
+        largest at the top. If all of these values are the same they are
+        drawn half way up.
+        
+        Inputs:
+        -------
+        name    - The name of the series, used to give its values to
+                  add_values.
+        colour  - The (red, green, blue) colour to draw the series in.
+        style   - 'bar' to draw each value as a bar from the bottom of the
+                  graph, or 'line' to draw only the top pixel of each bar.
+        low     - The value shown at the bottom of the graph, or None to use
+                  the smallest value within the horizon.
+        high    - The value shown at the top of the graph, or None to use the
+                  largest value within the horizon.
+        horizon - The number of most recent values the smallest and largest
+                  values are taken from. Must be at least 8, the number of
+                  values shown.
+        """
+
+        if name in self._series:
+            raise ValueError("A series with name '%s' already exists" % name)
+
+        if style not in SERIES_STYLES:
+            raise ValueError("style should be one of %s"
+                             % ", ".join(SERIES_STYLES))
+
+        if horizon < 8:
+            raise ValueError("horizon should be at least 8")
+
+        if len(colour) != 3:
+            raise ValueError("colour should be a (red, green, blue) sequence")
+
+        self._series[name] = _Series(colour, style, low, high, horizon)
+
+
+    def remove_series(self, name):
+        """
+        Stop plotting the series with the given name, and redraw the graph.
+        """
+
+        if name not in self._series:
+            raise ValueError("There is no series with name '%s'" % name)
+
+        del self._series[name]
+
+        self._draw()
+
+
+    def add_values(self, values):
+        """
+        Add the next value of each series to the graph.
+        
+        Update the graph with a new column on the right-hand side, holding
+        one value for each series, and shift the existing columns one place
+        to the left. The LED matrix is only updated once for all series.
+        
+        Inputs:
+        -------
+        values - Dictionary of the new value of each series, by name, or a
+                 sequence of values in the order the series were added. The
+                 values are raw readings, e.g. a temperature in degrees,
+                 rather than fractions of the height of the graph. Series
+                 that are not given a value (or are given NaN) are left
+                 blank in the new column.
+        """
+
+        if isinstance(values, dict):
+            for name in values:
+                if name not in self._series:
+                    raise ValueError("There is no series with name '%s'"
+                                     % name)
+
+            values = [values.get(name, np.nan) for name in self._series]
+
+        elif len(values) != len(self._series):
+            raise ValueError("values should have one value for each of the "
+                             "%d series" % len(self._series))
+
+        for series, value in zip(self._series.values(), values):
+            series.add(self._series_oldest, value)
+
+        self._series_oldest = (self._series_oldest + 1) % 8
+
+        self._draw()
+
+
+    def _push(self, value, low=0):
+        """
+        Add a bar to the ring buffer, replacing the oldest bar.
+        """
+
+        self._values[self._oldest] = value
+        self._lows[self._oldest]   = low
+        self._oldest = (self._oldest + 1) % 8
+
+
+    def _push_result(self, result):
+        """
+        Add a bar for the result of a WindowAggregator.
+        """
+
+        if isinstance(result, tuple):
+            self._push(result[1], result[0])
+        else:
+            self._push(result)
+
+
+    def _draw(self):
+        """
+        Draw the bars stored in the ring buffers on the LED matrix.
+        
+        Each bar is 8 pixels high, with one pixel per eighth of its value. Any
+        remaining fraction of an eighth is shown by dimming the top pixel of
+        the bar (and the bottom pixel, for bars that do not start at 0). The
+        bars added using add_bar and those of every series are drawn at once,
+        taking the brightest value of each colour at each pixel.
+        """
+
+        # Bar values from oldest (left) to newest (right), one row for the
+        # bars added using add_bar followed by one for each series
+        values  = [np.roll(self._values, -self._oldest)]
+        lows    = [np.roll(self._lows, -self._oldest)]
+        colours = [self.bar_colour]
+
+        for series in self._series.values():
+            high, low = series.scale(self._series_oldest)
+
+            values.append(high)
+            lows.append(low)
+            colours.append(series.colour)
+
+        values  = np.array(values)[:,np.newaxis,:]
+        lows    = np.array(lows)[:,np.newaxis,:]
+        colours = np.array(colours)[:,np.newaxis,np.newaxis,:]
+
+        # Fraction of each pixel that is covered by its bar
+        fill = np.clip(values * 8 - _row_heights, 0, 1)
+        fill -= np.clip(lows * 8 - _row_heights, 0, fill)
+
+        pixels = np.rint((fill[:,:,:,np.newaxis] * colours).max(axis=0))
+
+        self.set_pixels(pixels.astype(np.uint8).reshape(64,3).tolist())
+
+
+class _Series(object):
+    """
+    The values and settings of one named series of a SenseGraph.
+    """
+
+    def __init__(self, colour, style, low, high, horizon):
+
+        self.colour = list(colour)
+        self.style  = style
+        self.low    = low
+        self.high   = high
+
+        # Ring buffer of the 8 values shown, sharing its position with the
+        # other series, and the range of the values within the horizon
+        self.values = np.full(8, np.nan)
+        self.range  = SlidingRange(horizon)
+
+
+    def add(self, position, value):
+        """
+        Store a new value at the given position of the ring buffer.
+        """
+
+        value = float(value)
+
+        self.values[position] = value
+        self.range.add(value)
+
+
+    def clear(self):
+
+        self.values[:] = np.nan
+        self.range.clear()
+
+
+    def scale(self, oldest):
+        """
+        Return the tops and bottoms of the bars for the values shown, oldest
+        first, as fractions of the height of the graph.
+        """
+
+        low  = self.range.min if self.low is None else self.low
+        high = self.range.max if self.high is None else self.high
+
+        values = np.roll(self.values, -oldest)
+
+        if low is None or high is None:
+            tops = np.full(8, np.nan)
+        elif high > low:
+            tops = np.clip((values - low) / (high - low), 0, 1)
+        else:
+            tops = np.where(values == values, 0.5, np.nan)
+
+        if self.style == 'line':
+            # Lines are one pixel high, so start at the top of the bottom row
+            tops    = 0.125 + 0.875 * tops
+            bottoms = tops - 0.125
+        else:
+            bottoms = np.zeros(8)
+
+        # Values that are missing are left blank
+        return np.nan_to_num(tops), np.nan_to_num(bottoms)
+
+
+def _call_repeatedly(function, interval=None):
+    """
+    Generator returning the result of calling function, indefinitely.
+    
+    Waits interval seconds between each call, unless interval is None.
+    """
+
+    while True:
+        yield function()
+
+        if interval is not None:
+            time.sleep(interval)
 
 
 if __name__ == "__main__":
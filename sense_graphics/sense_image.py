@@ -1,6 +1,10 @@
-from __future__ import absolute_import
+from __future__ import absolute_import, division
 from sense_hat import SenseHat
-import time
+from .animation_file import AnimationFile
+from .display import SenseHatDisplay
+from .framebuffer import FramebufferOutput
+from .playback import AnimationPlayer
+from .transition import Transition
 
 
 class SenseImage(SenseHat):
@@ -15,28 +19,307 @@ class SenseImage(SenseHat):
     
     Methods:
     --------
-    set_pixels_dynamic   - Display a LayerSet object with animations.
+    set_pixels_dynamic       - Display a LayerSet object with animations.
+    set_pixels_dynamic_async - Display animations from an asyncio event loop.
+    set_pixels_from_file     - Display an animation saved to a file.
+    set_pixels_transition    - Display a transition between two LayerSets.
+    set_display              - Set the display backend to show animations on.
+    set_profiling            - Record how long each stage of a frame takes.
+    set_colour               - Adjust the brightness and colour of animations.
+    set_write_mode           - Choose how unchanged pixels are written.
+    use_framebuffer          - Write animations directly to the framebuffer.
     """
     
-    def set_pixels_dynamic(self, layer_set, scroll_speed=0.5, total_time=10):
+    def __init__(self, *args, **kwargs):
+        
+        SenseHat.__init__(self, *args, **kwargs)
+        
+        self.player = AnimationPlayer(SenseHatDisplay(self))
+        
+    
+    def set_display(self, display=None):
+        """
+        Set the display backend that animations are written to.
+        
+        By default animations are shown using the set_pixels method. Any
+        DisplayBackend object can be used instead, e.g. a VirtualDisplay to
+        record the frames of an animation.
+        
+        Inputs:
+        -------
+        display - The DisplayBackend to use, or None to go back to using the
+                  set_pixels method. Any previous backend is closed.
+        """
+        
+        self.player.display.close()
+        
+        if display is None:
+            display = SenseHatDisplay(self)
+        
+        self.player.display = display
+        self.player.clear_last_frame()
+        
+    
+    def set_profiling(self, stats=None):
+        """
+        Record how long each stage of displaying a frame takes.
+        
+        Once set, the time taken to render and write each frame shown by the
+        set_pixels_ methods is recorded, broken down into stages such as
+        getting each layer's pixels, combining the layers and writing to the
+        display. See the RenderStats class for the stages recorded.
+        
+        Inputs:
+        -------
+        stats - The RenderStats object to record timings in, or None to stop
+                recording.
+        
+        Returns the RenderStats object.
+        """
+        
+        self.player.stats = stats
+        
+        return stats
+        
+    
+    def set_colour(self, colour=None):
+        """
+        Adjust the brightness, gamma or colour temperature of animations.
+        
+        Every frame shown by the set_pixels_ methods is corrected using the
+        given ColourLUT's lookup table as it is written to the display. The
+        ColourLUT's settings can be changed at any time, e.g. from another
+        thread while an animation is playing, to dim or fade the display.
+        
+        Inputs:
+        -------
+        colour - The ColourLUT object to correct frames with, or None to show
+                 frames unchanged.
+        
+        Returns the ColourLUT object.
+        """
+        
+        self.player.colour = colour
+        
+        return colour
+        
+    
+    def set_write_mode(self, skip_unchanged=True, partial_pixels=0):
+        """
+        Choose how frames that are the same as, or close to, the last frame
+        are written to the display.
+        
+        Inputs:
+        -------
+        skip_unchanged - If True, frames that are the same as the last frame
+                         written are not written again, which saves the
+                         conversion to lists and the write for animations
+                         that often hold still.
+        partial_pixels - The most pixels that can differ from the last frame
+                         for only those pixels to be written (using set_pixel,
+                         or writing only those values to the framebuffer).
+                         0 always writes whole frames.
+        """
+        
+        self.player.skip_unchanged = skip_unchanged
+        self.player.partial_pixels = partial_pixels
+        
+    
+    def use_framebuffer(self, enabled=True, path=None):
+        """
+        Write animations directly to the memory-mapped framebuffer.
+        
+        When enabled, frames shown by set_pixels_dynamic are packed into the
+        framebuffer's RGB565 format using numpy and written all at once,
+        rather than being converted to lists and passed to set_pixels. The
+        rotation set using set_rotation is still applied.
+        
+        Inputs:
+        -------
+        enabled - Set to True to write to the framebuffer directly, or False
+                  to go back to using set_pixels.
+        path    - The framebuffer device to write to. If None, the Sense Hat
+                  framebuffer device is used.
+        """
+        
+        if enabled:
+            self.set_display(FramebufferOutput(path, self.rotation))
+        else:
+            self.set_display(None)
+        
+    
+    def set_rotation(self, r=0, redraw=True):
+        
+        SenseHat.set_rotation(self, r, redraw)
+        
+        # Keep the rotation of a framebuffer display in step
+        if isinstance(self.player.display, FramebufferOutput):
+            self.player.display.rotation = self.rotation
+        
+        # The pixels on the display have moved
+        self.player.clear_last_frame()
+        
+    
+    def set_pixels_dynamic(self, layer_set, scroll_speed=0.5, total_time=10,
+                           fps=None, drop_policy='skip', pipeline=None,
+                           queue_size=8):
         """
         Display a LayerSet object with animations
         
         Use this method to display a LayerSet object as an animated image. Any
         behaviours set using its add_effect_ methods will function in the way
-        that they have been set.
+        that they have been set. Frames are shown at fixed times measured from
+        the start of the animation, so the time taken to draw each frame does
+        not slow the animation down.
+        
+        Frames can also be rendered ahead of time in the background by setting
+        the pipeline input, in which case the display only has to write the
+        frames that have already been rendered.
         
         Inputs:
         -------
         layer_set     - A LayerSet object
-        scroll_speed  - The speed of the animation in frames per second.
+        scroll_speed  - The time in seconds between frames. Ignored if fps is
+                        given.
         total_time    - The total time to display the animation, in seconds.
+        fps           - The speed of the animation in frames per second.
+        drop_policy   - What to do if drawing frames falls behind. Use 'skip'
+                        to skip frames and stay in time, 'catch_up' to show
+                        the late frames as quickly as possible, or 'stretch'
+                        to slow the animation down. See FrameScheduler.
+        pipeline      - None to render each frame just before it is shown,
+                        'thread' to render frames in a background thread, or
+                        'process' to render them in a separate process.
+        queue_size    - The maximum number of frames to render in advance
+                        when using a pipeline.
+        
+        Returns a PlaybackStats object with the achieved frame rate, jitter
+        and number of dropped frames.
         """
         
-        num_frames = int(total_time/scroll_speed)
+        fps, num_frames = _frame_count(scroll_speed, total_time, fps)
         
-        for frame_num in range(num_frames):
-            
-            self.set_pixels(layer_set[frame_num])
-            time.sleep(scroll_speed)
-            
\ No newline at end of file
+        return self.player.play(layer_set, fps, num_frames=num_frames,
+                                drop_policy=drop_policy, pipeline=pipeline,
+                                queue_size=queue_size)
+    
+    
+    async def set_pixels_dynamic_async(self, layer_set, scroll_speed=0.5,
+                                       total_time=10, fps=None,
+                                       drop_policy='skip', pipeline='thread',
+                                       queue_size=8):
+        """
+        Display a LayerSet object with animations from an asyncio event loop.
+        
+        A coroutine version of set_pixels_dynamic, which waits between frames
+        using asyncio so that other tasks (e.g. reading the sensors) can run
+        alongside the animation. Frames are rendered in the background by a
+        thread or process, so rendering does not block the event loop. The
+        inputs are the same as for set_pixels_dynamic, except that pipeline
+        must be either 'thread' or 'process'.
+        
+        Returns a PlaybackStats object with the achieved frame rate, jitter
+        and number of dropped frames.
+        """
+        
+        fps, num_frames = _frame_count(scroll_speed, total_time, fps)
+        
+        return await self.player.play_async(layer_set, fps,
+                                            num_frames=num_frames,
+                                            drop_policy=drop_policy,
+                                            pipeline=pipeline,
+                                            queue_size=queue_size)
+    
+    
+    def set_pixels_from_file(self, path, total_time=None, fps=None,
+                             drop_policy='skip', pipeline=None, queue_size=8):
+        """
+        Display an animation saved to a file.
+        
+        Plays an animation file created using the export method of a LayerSet
+        object. The frames are read directly from the file using a memory
+        map, so the layers do not have to be created or combined again.
+        
+        Inputs:
+        -------
+        path        - The path of the animation file.
+        total_time  - The total time to display the animation, in seconds.
+                      Defaults to the time taken to show every frame once.
+        fps         - The speed of the animation in frames per second.
+                      Defaults to the speed saved in the file.
+        drop_policy - See set_pixels_dynamic.
+        pipeline    - See set_pixels_dynamic.
+        queue_size  - See set_pixels_dynamic.
+        
+        Returns a PlaybackStats object with the achieved frame rate, jitter
+        and number of dropped frames.
+        """
+        
+        animation = AnimationFile(path)
+        
+        if fps is None:
+            fps = animation.fps
+        
+        if total_time is None:
+            total_time = len(animation) / fps
+        
+        return self.set_pixels_dynamic(animation, total_time=total_time,
+                                       fps=fps, drop_policy=drop_policy,
+                                       pipeline=pipeline,
+                                       queue_size=queue_size)
+        
+    
+    def set_pixels_transition(self, outgoing, incoming, effect='crossfade',
+                              direction='E', total_time=1, fps=25,
+                              drop_policy='skip', pipeline=None,
+                              queue_size=8):
+        """
+        Display a transition from one LayerSet object to another.
+        
+        Both LayerSets keep animating while the outgoing one is replaced by
+        the incoming one, using a crossfade, a wipe or a push. The frames of
+        the transition are created in one go before it starts (see the
+        Transition class), so it can be shown at the full frame rate.
+        Afterwards, show the incoming LayerSet as usual, e.g. using
+        set_pixels_dynamic.
+        
+        Inputs:
+        -------
+        outgoing    - The LayerSet shown at the start of the transition.
+        incoming    - The LayerSet shown at the end of the transition.
+        effect      - 'crossfade' to fade from one to the other, 'wipe' to
+                      uncover the incoming LayerSet with a moving edge, or
+                      'push' to slide it on, pushing the outgoing one off.
+        direction   - The direction a wipe or push moves in: 'N', 'S', 'E'
+                      or 'W' for north (up), south (down), east (right) or
+                      west (left).
+        total_time  - The time the transition takes, in seconds.
+        fps         - The speed of the transition in frames per second.
+        drop_policy - See set_pixels_dynamic.
+        pipeline    - See set_pixels_dynamic.
+        queue_size  - See set_pixels_dynamic.
+        
+        Returns a PlaybackStats object with the achieved frame rate, jitter
+        and number of dropped frames.
+        """
+        
+        num_frames = max(int(total_time*fps), 1)
+        
+        transition = Transition(outgoing, incoming, num_frames, effect,
+                                direction)
+        
+        return self.set_pixels_dynamic(transition, total_time=num_frames/fps,
+                                       fps=fps, drop_policy=drop_policy,
+                                       pipeline=pipeline,
+                                       queue_size=queue_size)
+
+
+def _frame_count(scroll_speed, total_time, fps):
+    """
+    Return the frame rate and number of frames for set_pixels_dynamic.
+    """
+    
+    if fps is None:
+        return (1 / scroll_speed, int(total_time/scroll_speed))
+    else:
+        return (fps, int(total_time*fps))
@@ -0,0 +1,252 @@
+from __future__ import absolute_import, division
+from collections import deque
+import time
+
+
+AGGREGATES = ('mean', 'max', 'min', 'envelope', 'last')
+
+
+class WindowAggregator(object):
+    """
+    Combines a stream of samples into one value per window of samples.
+
+    Windows either contain a fixed number of samples, or cover a fixed length
+    of time. Only running totals are kept for the current window, so adding a
+    sample takes the same time however large the window is. The aggregate
+    used to combine the samples of a window can be:
+
+    'mean'     - The average of the samples.
+    'max'      - The largest sample.
+    'min'      - The smallest sample.
+    'envelope' - A (min, max) tuple of the smallest and largest samples.
+    'last'     - The most recent sample.
+
+    Methods:
+    --------
+    add   - Add a sample, returning the result of any window it completes.
+    flush - Return the result of the current, incomplete window.
+    """
+
+    def __init__(self, aggregate='mean', count=None, duration=None,
+                 clock=None):
+        """
+        Initialise the aggregator with the type and size of window.
+
+        Inputs:
+        -------
+        aggregate - How to combine the samples in a window. One of 'mean',
+                    'max', 'min', 'envelope' or 'last'.
+        count     - The number of samples in each window.
+        duration  - The length of each window in seconds. Exactly one of count
+                    and duration should be given.
+        clock     - Function returning the current time in seconds, used when
+                    samples are added without a timestamp. Defaults to
+                    time.monotonic.
+        """
+
+        if aggregate not in AGGREGATES:
+            raise ValueError("aggregate should be one of %s"
+                             % ", ".join(AGGREGATES))
+
+        if (count is None) == (duration is None):
+            raise ValueError("Exactly one of count and duration should be set")
+
+        if count is not None and count < 1:
+            raise ValueError("count should be at least 1")
+
+        if duration is not None and duration <= 0:
+            raise ValueError("duration should be greater than 0")
+
+        self.aggregate = aggregate
+        self.count     = count
+        self.duration  = duration
+        self.clock     = clock if clock is not None else time.monotonic
+
+        self._window_start = None
+        self._reset()
+
+
+    def add(self, value, timestamp=None):
+        """
+        Add a sample to the current window.
+
+        Returns the result of the window that the sample completes, or None if
+        no window was completed. For windows of fixed duration, a window is
+        completed by the first sample that falls after its end.
+
+        Inputs:
+        -------
+        value     - The value of the sample.
+        timestamp - The time the sample was taken, in seconds. If None, the
+                    current time is used. Only needed for windows of fixed
+                    duration.
+        """
+
+        result = None
+
+        if self.duration is not None:
+            if timestamp is None:
+                timestamp = self.clock()
+
+            if self._window_start is None:
+                self._window_start = timestamp
+
+            elapsed = timestamp - self._window_start
+            if elapsed >= self.duration:
+                result = self.flush()
+
+                # Start the new window at the boundary the sample falls in
+                self._window_start += self.duration * (elapsed //
+                                                       self.duration)
+
+        if self._num_samples == 0:
+            self._min = self._max = value
+        elif value < self._min:
+            self._min = value
+        elif value > self._max:
+            self._max = value
+
+        self._num_samples += 1
+        self._total += value
+        self._last = value
+
+        if self.count is not None and self._num_samples >= self.count:
+            result = self.flush()
+
+        return result
+
+
+    def flush(self):
+        """
+        Return the result of the current window and start a new window.
+
+        Returns None if no samples have been added to the current window.
+        """
+
+        if self._num_samples == 0:
+            return None
+
+        if self.aggregate == 'mean':
+            result = self._total / self._num_samples
+        elif self.aggregate == 'max':
+            result = self._max
+        elif self.aggregate == 'min':
+            result = self._min
+        elif self.aggregate == 'envelope':
+            result = (self._min, self._max)
+        else:
+            result = self._last
+
+        self._reset()
+
+        return result
+
+
+    def _reset(self):
+
+        self._num_samples = 0
+        self._total = 0
+        self._min   = None
+        self._max   = None
+        self._last  = None
+
+
+class SlidingRange(object):
+    """
+    Keeps the smallest and largest of the most recent samples of a stream.
+
+    The window holds the last length samples. Rather than searching the
+    window each time it changes, a monotonic deque of candidates is kept for
+    each of the minimum and maximum: a sample is dropped from the minimum's
+    deque as soon as a smaller sample arrives after it, as it can then never
+    be the smallest in the window again, and likewise for the maximum. Each
+    sample is added to and removed from each deque at most once, so adding a
+    sample takes constant time on average, however long the window is.
+
+    Samples that are NaN take up a place in the window but are otherwise
+    ignored.
+
+    Methods:
+    --------
+    add   - Add a sample, dropping the oldest sample from a full window.
+    clear - Remove all samples.
+    """
+
+    def __init__(self, length):
+        """
+        Initialise the range with the number of samples in the window.
+        """
+
+        if length < 1:
+            raise ValueError("length should be at least 1")
+
+        self.length = length
+        self.clear()
+
+
+    def __repr__(self):
+
+        return '%s(length=%d, min=%r, max=%r)' % (
+            self.__class__.__name__, self.length, self.min, self.max)
+
+
+    @property
+    def min(self):
+        """
+        The smallest sample in the window, or None if there are none.
+        """
+
+        return self._mins[0][1] if self._mins else None
+
+
+    @property
+    def max(self):
+        """
+        The largest sample in the window, or None if there are none.
+        """
+
+        return self._maxs[0][1] if self._maxs else None
+
+
+    def add(self, value):
+        """
+        Add a sample to the window.
+        """
+
+        index = self._count
+        self._count += 1
+
+        # Only the oldest candidate can have left the window, as the
+        # samples before it have already been dropped
+        expired = index - self.length
+        mins, maxs = self._mins, self._maxs
+
+        if mins and mins[0][0] <= expired:
+            mins.popleft()
+
+        if maxs and maxs[0][0] <= expired:
+            maxs.popleft()
+
+        if value != value:
+            return
+
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+
+        mins.append((index, value))
+        maxs.append((index, value))
+
+
+    def clear(self):
+        """
+        Remove all samples from the window.
+        """
+
+        # Deques of (sample number, value) for the candidate minimums, in
+        # increasing order, and candidate maximums, in decreasing order
+        self._mins  = deque()
+        self._maxs  = deque()
+        self._count = 0
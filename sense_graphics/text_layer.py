@@ -0,0 +1,367 @@
+from __future__ import absolute_import
+from collections import OrderedDict
+import numpy as np
+from .canvas_layer import CanvasLayer
+
+
+# Built-in 3x5 pixel font. Each glyph is given as rows of '#' (lit) and '.'
+# (unlit) pixels, and may be narrower than 3 pixels. Lower case letters are
+# shown using the upper case glyphs.
+FONT_3X5 = {
+    ' ' : ('..', '..', '..', '..', '..'),
+    'A' : ('.#.', '#.#', '###', '#.#', '#.#'),
+    'B' : ('##.', '#.#', '##.', '#.#', '##.'),
+    'C' : ('.##', '#..', '#..', '#..', '.##'),
+    'D' : ('##.', '#.#', '#.#', '#.#', '##.'),
+    'E' : ('###', '#..', '##.', '#..', '###'),
+    'F' : ('###', '#..', '##.', '#..', '#..'),
+    'G' : ('.##', '#..', '#.#', '#.#', '.##'),
+    'H' : ('#.#', '#.#', '###', '#.#', '#.#'),
+    'I' : ('###', '.#.', '.#.', '.#.', '###'),
+    'J' : ('..#', '..#', '..#', '#.#', '.#.'),
+    'K' : ('#.#', '#.#', '##.', '#.#', '#.#'),
+    'L' : ('#..', '#..', '#..', '#..', '###'),
+    'M' : ('#.#', '###', '###', '#.#', '#.#'),
+    'N' : ('##.', '#.#', '#.#', '#.#', '#.#'),
+    'O' : ('.#.', '#.#', '#.#', '#.#', '.#.'),
+    'P' : ('##.', '#.#', '##.', '#..', '#..'),
+    'Q' : ('.#.', '#.#', '#.#', '##.', '.##'),
+    'R' : ('##.', '#.#', '##.', '#.#', '#.#'),
+    'S' : ('.##', '#..', '.#.', '..#', '##.'),
+    'T' : ('###', '.#.', '.#.', '.#.', '.#.'),
+    'U' : ('#.#', '#.#', '#.#', '#.#', '###'),
+    'V' : ('#.#', '#.#', '#.#', '#.#', '.#.'),
+    'W' : ('#.#', '#.#', '###', '###', '#.#'),
+    'X' : ('#.#', '#.#', '.#.', '#.#', '#.#'),
+    'Y' : ('#.#', '#.#', '.#.', '.#.', '.#.'),
+    'Z' : ('###', '..#', '.#.', '#..', '###'),
+    '0' : ('###', '#.#', '#.#', '#.#', '###'),
+    '1' : ('.#.', '##.', '.#.', '.#.', '###'),
+    '2' : ('##.', '..#', '.#.', '#..', '###'),
+    '3' : ('##.', '..#', '.#.', '..#', '##.'),
+    '4' : ('#.#', '#.#', '###', '..#', '..#'),
+    '5' : ('###', '#..', '##.', '..#', '##.'),
+    '6' : ('.##', '#..', '###', '#.#', '###'),
+    '7' : ('###', '..#', '.#.', '.#.', '.#.'),
+    '8' : ('###', '#.#', '###', '#.#', '###'),
+    '9' : ('###', '#.#', '###', '..#', '##.'),
+    '.' : ('.', '.', '.', '.', '#'),
+    ',' : ('.', '.', '.', '#', '#'),
+    ':' : ('.', '#', '.', '#', '.'),
+    ';' : ('.', '#', '.', '#', '#'),
+    '!' : ('#', '#', '#', '.', '#'),
+    "'" : ('#', '#', '.', '.', '.'),
+    '?' : ('##.', '..#', '.#.', '...', '.#.'),
+    '-' : ('...', '...', '###', '...', '...'),
+    '+' : ('...', '.#.', '###', '.#.', '...'),
+    '=' : ('...', '###', '...', '###', '...'),
+    '_' : ('...', '...', '...', '...', '###'),
+    '*' : ('...', '#.#', '.#.', '#.#', '...'),
+    '/' : ('..#', '..#', '.#.', '#..', '#..'),
+    '%' : ('#.#', '..#', '.#.', '#..', '#.#'),
+    '#' : ('#.#', '###', '#.#', '###', '#.#'),
+    '"' : ('#.#', '#.#', '...', '...', '...'),
+    '(' : ('.#', '#.', '#.', '#.', '.#'),
+    ')' : ('#.', '.#', '.#', '.#', '#.'),
+    '[' : ('##', '#.', '#.', '#.', '##'),
+    ']' : ('##', '.#', '.#', '.#', '##'),
+    '<' : ('..#', '.#.', '#..', '.#.', '..#'),
+    '>' : ('#..', '.#.', '..#', '.#.', '#..'),
+    '$' : ('.##', '##.', '.#.', '.##', '##.'),
+    '&' : ('.#.', '#.#', '.#.', '#.#', '.##'),
+    '@' : ('###', '#.#', '###', '#..', '.##'),
+}
+
+
+class GlyphAtlas(object):
+    """
+    Font rasterised once into a single array, used to draw text as strips.
+
+    All of the glyphs of the font are drawn side by side into one array of
+    alpha values when the atlas is created, so drawing text only copies
+    slices of this array. Strips of text that have been drawn are kept in a
+    cache (with the least recently used strips discarded first), so an atlas
+    is best shared between layers; the default_atlas function returns an atlas
+    of the built-in font that is shared by every TextLayer not given another.
+
+    Methods:
+    --------
+    render - Return a strip of text as an 8xWx4 array.
+    """
+
+    def __init__(self, font=FONT_3X5, spacing=1, cache_size=64):
+        """
+        Initialise the atlas by drawing every glyph of font.
+
+        Inputs:
+        -------
+        font       - Dictionary of glyphs, with each character mapped to a
+                     sequence of rows of '#' (lit) and '.' (unlit) pixels,
+                     as in FONT_3X5. Every glyph must have the same number of
+                     rows, at most 8. The font should contain '?', which is
+                     shown in place of characters that are not in the font.
+        spacing    - The number of blank columns between characters.
+        cache_size - The maximum number of strips to keep in the cache.
+        """
+
+        heights = set(len(rows) for rows in font.values())
+
+        if len(heights) != 1 or heights.pop() > 8:
+            raise ValueError("Every glyph should have the same number of "
+                             "rows, at most 8")
+
+        self.spacing    = spacing
+        self.cache_size = cache_size
+
+        self.height = len(next(iter(font.values())))
+        self.top    = (9 - self.height) // 2
+
+        # Column of the atlas at which each glyph starts, and its width
+        self.columns = {}
+        self.widths  = {}
+
+        column = 0
+        for char, rows in sorted(font.items()):
+            self.columns[char] = column
+            self.widths[char]  = len(rows[0])
+            column += len(rows[0])
+
+        self.atlas = np.zeros((self.height, column), dtype=np.uint8)
+
+        for char, rows in font.items():
+            start = self.columns[char]
+            for row, pixels in enumerate(rows):
+                for col, pixel in enumerate(pixels):
+                    if pixel == '#':
+                        self.atlas[row, start + col] = 255
+
+        self.atlas.flags.writeable = False
+
+        self._strips = OrderedDict()
+
+
+    def __repr__(self):
+
+        return '%s(%d glyphs)' % (self.__class__.__name__, len(self.widths))
+
+
+    def __getstate__(self):
+
+        # Cached strips are not needed to draw text, so are not pickled
+        state = self.__dict__.copy()
+        state['_strips'] = OrderedDict()
+
+        return state
+
+
+    def render(self, text, colour=(255, 255, 255), padding=0, previous=None):
+        """
+        Return a strip of text as a read-only 8xWx4 uint8 array.
+
+        The rgb values of the strip are all set to colour, and the alpha
+        values are 255 where the text is drawn and 0 elsewhere. The strip is
+        at least 8 pixels wide.
+
+        Inputs:
+        -------
+        text     - The text to draw.
+        colour   - The (red, green, blue) colour of the text.
+        padding  - The number of blank columns before and after the text.
+        previous - Text previously drawn with the same colour and padding,
+                   e.g. the last text shown by a ticker. If its strip is
+                   still cached, the characters that the two texts start and
+                   end with in common are copied from it rather than drawn.
+        """
+
+        colour = tuple(int(value) for value in colour)
+        key    = (text, colour, padding)
+
+        # Move strips to the end of the cache each time they are used
+        entry = self._strips.pop(key, None)
+
+        if entry is not None:
+            self._strips[key] = entry
+            return entry[0]
+
+        chars     = [self._get_char(char) for char in text]
+        positions = []
+
+        column = padding
+        for char in chars:
+            positions.append(column)
+            column += self.widths[char] + self.spacing
+
+        if chars:
+            column -= self.spacing
+
+        width = max(8, column + padding)
+
+        strip = np.empty((8, width, 4), dtype=np.uint8)
+        strip[:,:,:3] = colour
+        strip[:,:,3]  = 0
+
+        first, last = 0, len(chars)
+
+        old = self._strips.get((previous, colour, padding))
+
+        if old is not None and previous != text:
+            first, last = self._reuse(strip, chars, positions, old)
+
+        # Draw the characters that could not be copied
+        top = self.top
+        for char, column in zip(chars[first:last], positions[first:last]):
+            start = self.columns[char]
+            end   = start + self.widths[char]
+            strip[top:top+self.height, column:column+end-start, 3] = (
+                self.atlas[:, start:end] )
+
+        strip.flags.writeable = False
+
+        self._strips[key] = (strip, chars, positions)
+
+        while len(self._strips) > self.cache_size:
+            self._strips.popitem(last=False)
+
+        return strip
+
+
+    def _get_char(self, char):
+        """
+        Return the character of the font used to draw char.
+        """
+
+        if char in self.widths:
+            return char
+
+        if char.upper() in self.widths:
+            return char.upper()
+
+        return '?'
+
+
+    def _reuse(self, strip, chars, positions, old):
+        """
+        Copy the characters in common with a previously drawn strip.
+
+        The columns of the characters at the start of the text that are the
+        same as those of the old strip, and those at the end, are copied into
+        strip. Returns the range of characters (first, last) still to draw.
+        """
+
+        old_strip, old_chars, old_positions = old
+
+        # Number of characters in common at the start and end of both texts
+        limit = min(len(chars), len(old_chars))
+
+        first = 0
+        while first < limit and chars[first] == old_chars[first]:
+            first += 1
+
+        last = 0
+        while (last < limit - first and
+               chars[-1 - last] == old_chars[-1 - last]):
+            last += 1
+
+        if first:
+            end = positions[first - 1] + self.widths[chars[first - 1]]
+            strip[:, :end, 3] = old_strip[:, :end, 3]
+
+        if last:
+            new_start = positions[len(chars) - last]
+            old_start = old_positions[len(old_chars) - last]
+            columns   = min(strip.shape[1] - new_start,
+                            old_strip.shape[1] - old_start)
+            strip[:, new_start:new_start+columns, 3] = (
+                old_strip[:, old_start:old_start+columns, 3] )
+
+        return first, len(chars) - last
+
+
+_default_atlas = None
+
+
+def default_atlas():
+    """
+    Return the GlyphAtlas of the built-in font shared by TextLayers.
+    """
+
+    global _default_atlas
+
+    if _default_atlas is None:
+        _default_atlas = GlyphAtlas()
+
+    return _default_atlas
+
+
+class TextLayer(CanvasLayer):
+    """
+    Layer that shows a line of text, scrolling it across the display.
+
+    The text is drawn using a GlyphAtlas into a strip, which is shown through
+    a viewport in the same way as a CanvasLayer. When scrolling, the text
+    enters from the right of the display and leaves on the left, moving by
+    one pixel each frame. Unlike the SenseHat class' show_message method, a
+    TextLayer can be combined with other layers and effects in a LayerSet.
+
+    Methods:
+    --------
+    set_text - Change the text shown.
+    """
+
+    __slots__ = ('text', 'colour', 'font', 'padding')
+
+    def __init__(self, text, colour=(255, 255, 255), name="Text", font=None,
+                 scroll=True):
+        """
+        Initialise the layer with the text to show.
+
+        Inputs:
+        -------
+        text   - The text to show.
+        colour - The (red, green, blue) colour of the text.
+        name   - The name of this layer.
+        font   - The GlyphAtlas to draw the text with, or None to use the
+                 built-in 3x5 pixel font.
+        scroll - Set to True to scroll the text across the display. Set to
+                 False to show the start of the text without moving it, e.g.
+                 for short text or to apply a scrolling effect instead.
+        """
+
+        if font is None:
+            font = default_atlas()
+
+        self.name     = name
+        self.font     = font
+        self.colour   = tuple(int(value) for value in colour)
+        self.filename = None
+        self.text     = None
+
+        # Blank columns either side let the text scroll in and out of view
+        self.padding  = 8 if scroll else 0
+
+        self.set_text(text)
+
+
+    def __repr__(self):
+
+        return '%s("%s")' % (self.__class__.__name__, self.name)
+
+
+    def set_text(self, text):
+        """
+        Change the text shown by the layer.
+
+        Only the characters that differ from the current text are drawn
+        again. The number of frames of the layer changes with the length of
+        the text, so when the layer is part of a LayerSet, use the LayerSet's
+        set_text method, or call its clear_cache method afterwards.
+        """
+
+        self.rgba = self.font.render(text, self.colour, self.padding,
+                                     previous=self.text)
+        self.text = text
+
+        if self.padding:
+            self.set_scroll('E')
+        else:
+            self.set_path([(0, 0)])
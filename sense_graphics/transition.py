@@ -0,0 +1,275 @@
+from __future__ import absolute_import, division
+import numpy as np
+from .frame import _div255
+
+
+EFFECTS    = ('crossfade', 'wipe', 'push')
+DIRECTIONS = ('N', 'S', 'E', 'W')
+
+
+class Transition(object):
+    """
+    Animation that changes from one scene to another.
+
+    A Transition takes two LayerSets (or any objects with the same render
+    method, such as AnimationFiles), the outgoing scene and the incoming
+    scene, and produces num_frames frames that change from one to the other
+    using one of the following effects:
+
+    'crossfade' - The outgoing scene fades out as the incoming scene fades in.
+    'wipe'      - The incoming scene is uncovered by an edge moving across the
+                  display in the given direction, which is blended across one
+                  pixel so that it moves smoothly.
+    'push'      - The incoming scene slides onto the display in the given
+                  direction, pushing the outgoing scene off the other side.
+
+    Both scenes keep animating during the transition. The frames of each
+    scene are rendered together using their render_frames methods, and are
+    then combined using a weight, or for 'push' a position, for every pixel
+    of every frame, worked out ahead of time, in a single numpy operation.
+    The frames are created the first time one is needed and kept, so playing
+    a Transition costs no more per frame than playing a single scene. Neither
+    the first nor the last frame is one of the scenes on its own, so the
+    incoming scene can be shown straight after the transition.
+
+    A Transition can be played in the same way as a LayerSet, e.g. using the
+    set_pixels_dynamic method of the SenseImage class, or created and played
+    in one step using its set_pixels_transition method.
+
+    Methods:
+    --------
+    render        - Return the rgb values of a frame as an array.
+    render_into   - Write the rgb values of a frame to an array.
+    render_frames - Return the rgb values of many frames as an array.
+    clear_cache   - Create the frames again from the scenes.
+    """
+
+    def __init__(self, outgoing, incoming, num_frames=8, effect='crossfade',
+                 direction='E', outgoing_start=0, incoming_start=0):
+        """
+        Initialise the transition between two scenes.
+
+        Inputs:
+        -------
+        outgoing       - The LayerSet shown at the start of the transition.
+        incoming       - The LayerSet shown at the end of the transition.
+        num_frames     - The number of frames the transition takes.
+        effect         - 'crossfade', 'wipe' or 'push'.
+        direction      - The direction the edge of a wipe, or the scenes of a
+                         push, move in: 'N', 'S', 'E' or 'W' for north (up),
+                         south (down), east (right) or west (left). Not used
+                         by 'crossfade'.
+        outgoing_start - The frame of the outgoing scene to start from, e.g.
+                         the number of frames of it already shown.
+        incoming_start - The frame of the incoming scene to start from.
+        """
+
+        if effect not in EFFECTS:
+            raise ValueError("effect should be one of %s" % ", ".join(EFFECTS))
+
+        if direction not in DIRECTIONS:
+            raise ValueError("direction should be 'N', 'S', 'E' or 'W'")
+
+        if num_frames < 1:
+            raise ValueError("num_frames should be at least 1")
+
+        self.outgoing   = outgoing
+        self.incoming   = incoming
+        self.num_frames = num_frames
+        self.effect     = effect
+        self.direction  = direction
+
+        self.outgoing_start = outgoing_start
+        self.incoming_start = incoming_start
+
+        self.frames = None
+
+
+    def __repr__(self):
+
+        return '%s(%r, %r, %s)' % (self.__class__.__name__, self.outgoing,
+                                   self.incoming, self.effect)
+
+
+    def __len__(self):
+
+        return self.num_frames
+
+
+    def __getitem__(self, idx):
+        """
+        Return frame idx as a 64 element list of rgb values.
+
+        The list can be displayed using the SenseHat class' set_pixels method.
+        """
+
+        return self.render(idx).reshape(64,3).tolist()
+
+
+    def render(self, frame_num):
+        """
+        Return the rgb values of frame frame_num as an 8x8x3 uint8 array.
+
+        Frames after the end of the transition repeat it from the start. The
+        array returned is shared with the transition and is read-only.
+        """
+
+        return self._get_frames()[frame_num % self.num_frames]
+
+
+    def render_into(self, frame_num, out):
+        """
+        Write the rgb values of frame frame_num to an 8x8x3 uint8 array.
+
+        Returns out.
+        """
+
+        np.copyto(out, self.render(frame_num))
+
+        return out
+
+
+    def render_frames(self, start, stop, step=1):
+        """
+        Return the rgb values of a range of frames as an Fx8x8x3 uint8 array.
+        """
+
+        frame_nums = np.arange(start, stop, step)
+
+        return self._get_frames()[frame_nums % self.num_frames]
+
+
+    def clear_cache(self):
+        """
+        Create the frames of the transition again, e.g. after changing the
+        scenes or the settings of the transition.
+        """
+
+        self.frames = None
+
+
+    def _get_frames(self):
+        """
+        Return the Nx8x8x3 array of every frame of the transition, creating
+        it if needed.
+        """
+
+        if self.frames is not None:
+            return self.frames
+
+        num_frames = self.num_frames
+
+        outgoing = _render_range(self.outgoing, self.outgoing_start,
+                                 num_frames)
+        incoming = _render_range(self.incoming, self.incoming_start,
+                                 num_frames)
+
+        # How far through the transition each frame is, between 0 and 1
+        progress = np.arange(1, num_frames + 1) / (num_frames + 1)
+
+        if self.effect == 'push':
+            frames = _push(outgoing, incoming, progress, self.direction)
+
+        else:
+            if self.effect == 'crossfade':
+                weights = progress.reshape(-1, 1, 1, 1)
+            else:
+                weights = _wipe_weights(progress, self.direction)
+
+            frames = _blend(outgoing, incoming, weights)
+
+        frames.flags.writeable = False
+        self.frames = frames
+
+        return frames
+
+
+def _render_range(scene, start, num_frames):
+    """
+    Return frames start to start + num_frames of a scene as an Nx8x8x3 array.
+    """
+
+    if hasattr(scene, 'render_frames'):
+        return scene.render_frames(start, start + num_frames)
+
+    return np.array([scene.render(frame_num)
+                     for frame_num in range(start, start + num_frames)],
+                    dtype=np.uint8)
+
+
+def _distances(direction):
+    """
+    Return an 8x8 array of how far each pixel is from the edge of the
+    display that a wipe in the given direction starts from, in pixels.
+    """
+
+    steps = np.arange(8)
+
+    if direction == 'E':
+        return np.tile(steps, (8, 1))
+    elif direction == 'W':
+        return np.tile(steps[::-1], (8, 1))
+    elif direction == 'S':
+        return np.tile(steps[:,np.newaxis], (1, 8))
+    else:
+        return np.tile(steps[::-1,np.newaxis], (1, 8))
+
+
+def _wipe_weights(progress, direction):
+    """
+    Return the Nx8x8x1 weights of the incoming scene for a wipe.
+
+    The edge of the wipe is progress * 8 pixels from the edge it starts from,
+    and the pixels it lies within are weighted by how much of them it has
+    passed over.
+    """
+
+    edge = progress.reshape(-1, 1, 1) * 8
+
+    return np.clip(edge - _distances(direction), 0, 1)[...,np.newaxis]
+
+
+def _blend(outgoing, incoming, weights):
+    """
+    Return the weighted average of two Nx8x8x3 arrays of frames.
+
+    weights are the weights of the incoming frames, between 0 and 1, in an
+    array that can be broadcast against the frames. The result is rounded to
+    the nearest integer, using integer arithmetic.
+    """
+
+    weights = np.rint(weights * 255).astype(np.uint16)
+
+    values  = outgoing * (255 - weights)
+    values += incoming * weights
+    _div255(values)
+
+    return values.astype(np.uint8)
+
+
+def _push(outgoing, incoming, progress, direction):
+    """
+    Return the frames of a push of the incoming scene onto the display.
+
+    The two scenes are placed side by side as a 16 pixel strip, with the
+    incoming scene on the side it enters from, and each frame is gathered as
+    an 8 pixel window of the strip, moved by progress * 8 pixels.
+    """
+
+    num_frames = len(outgoing)
+    axis = 1 if direction in ('N', 'S') else 2
+
+    if direction in ('E', 'S'):
+        strip = np.concatenate((incoming, outgoing), axis=axis)
+        start = 8 - np.rint(progress * 8).astype(int)
+    else:
+        strip = np.concatenate((outgoing, incoming), axis=axis)
+        start = np.rint(progress * 8).astype(int)
+
+    index  = start[:,np.newaxis] + np.arange(8)
+    frames = np.arange(num_frames)[:,np.newaxis,np.newaxis]
+
+    if axis == 1:
+        return strip[frames, index[:,:,np.newaxis], np.arange(8)]
+    else:
+        return strip[frames, np.arange(8)[:,np.newaxis], index[:,np.newaxis,:]]
@@ -8,6 +8,7 @@ setup(name='sense-hat-graphics',
       author_email='ptl76@hotmail.co.uk',
       license='GPL-3.0',
       packages=['sense_graphics'],
+      python_requires='>=3.8',
       install_requires=[
           'sense_hat',
           'numpy'